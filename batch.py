@@ -0,0 +1,263 @@
+"""Batch solver
+
+This module solves many chart files at once: each chart is loaded and
+the path from its boat to its treasure is searched, with the charts
+shared out among worker processes.
+
+Charts are handed to the workers in chunks, so the cost of sending work
+to another process is paid once per chunk rather than once per chart,
+and the result of every chart is written as one line of JSON as soon as
+its chunk is done.
+
+Many queries on one large chart are shared out the same way, with the
+workers searching one copy of the chart in shared memory instead of each
+loading their own.
+
+Run it as a script:
+
+    python batch.py find_path --workers 4 > results.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from grid import Grid
+
+# the charts handed to a worker at a time
+CHUNK_SIZE = 8
+# the queries on a shared chart handed to a worker at a time
+QUERY_CHUNK_SIZE = 64
+
+# the grids this worker process has attached to, by shared memory name
+_ATTACHED = {}
+
+
+def load_chart(file_path):
+    """
+    Return the Grid stored in the chart file <file_path>
+
+    A path already drawn on the chart in "*" is read as open water.
+
+    @type file_path: str
+    @rtype: Grid
+    """
+    with open(file_path) as chart_file:
+        text = chart_file.read()
+    return Grid("", text.replace('*', '.').split('\n'))
+
+
+def solve_chart(file_path, algorithm='astar'):
+    """
+    Return the result of searching the chart file <file_path> for a path
+    from the boat to the treasure
+
+    The result holds the file, the size of the chart, the cost of the
+    path in the units of Node.distance and the [x, y] coordinates of its
+    nodes, with a cost of None and no nodes if there is no path.  A chart
+    that cannot be read or has no boat or treasure gives an error instead.
+
+    @type file_path: str
+    @type algorithm: str
+       see Grid.find_path
+    @rtype: dict
+
+    >>> import os.path
+    >>> result = solve_chart(os.path.join('find_path', 'test1.txt'))
+    >>> result['file'], result['cost'], len(result['path'])
+    ('find_path/test1.txt', 14, 2)
+    """
+    try:
+        grid = load_chart(file_path)
+    except (OSError, UnicodeDecodeError, ValueError) as error:
+        return {'file': file_path, 'error': str(error)}
+    result = {'file': file_path, 'width': grid.width, 'height': grid.height}
+    boat = getattr(grid, 'boat', None)
+    treasure = getattr(grid, 'treasure', None)
+    if boat is None or treasure is None:
+        result['error'] = 'the chart has no boat or no treasure'
+        return result
+    result.update(_route(grid, boat, treasure, algorithm))
+    return result
+
+
+def _route(grid, start_node, target_node, algorithm):
+    """
+    Return the cost and the [x, y] coordinates of the nodes of the path
+    find_path finds from start_node to target_node
+
+    @type grid: Grid
+    @type start_node: Node
+    @type target_node: Node
+    @type algorithm: str
+    @rtype: dict
+    """
+    grid.find_path(start_node, target_node, algorithm)
+    path = grid.retrace_path(start_node, target_node)
+    return {'cost': target_node.gcost if path else None,
+            'path': [[node.grid_x, node.grid_y] for node in path]}
+
+
+def _solve_chunk(file_paths, algorithm):
+    """
+    Return the results of solve_chart for every file in file_paths
+
+    This is the unit of work sent to a worker process.
+
+    @type file_paths: list[str]
+    @type algorithm: str
+    @rtype: list[dict]
+    """
+    return [solve_chart(file_path, algorithm) for file_path in file_paths]
+
+
+def _solve_shared_chunk(name, queries, algorithm):
+    """
+    Return the result of every query in <queries> on the grid in the
+    shared memory block <name>
+
+    This is the unit of work sent to a worker process.  The worker
+    attaches to the block once and keeps the grid for later chunks.
+
+    @type name: str
+    @type queries: list[((int, int), (int, int))]
+    @type algorithm: str
+    @rtype: list[dict]
+    """
+    grid = _ATTACHED.get(name)
+    if grid is None:
+        grid = _ATTACHED[name] = Grid.from_shared_memory(name)
+    results = []
+    for (start_x, start_y), (target_x, target_y) in queries:
+        result = {'start': [start_x, start_y], 'target': [target_x, target_y]}
+        result.update(_route(grid, grid.map[start_x][start_y],
+                             grid.map[target_x][target_y], algorithm))
+        results.append(result)
+    return results
+
+
+def solve_queries(grid, queries, algorithm='astar', workers=None,
+                  chunk_size=QUERY_CHUNK_SIZE):
+    """
+    Yield the path and its cost for every (start, target) query on
+    <grid>, in the order the chunks finish
+
+    The grid is copied into shared memory once; every worker process
+    searches that copy, so no chart is sent to or parsed by a worker.
+
+    @type grid: Grid
+    @type queries: list[((int, int), (int, int))]
+       the (x, y) coordinates of the start and the target of each path
+    @type algorithm: str
+       see Grid.find_path
+    @type workers: int, None
+       the number of worker processes, or None for one per processor
+    @type chunk_size: int
+       the number of queries sent to a worker at a time
+    @rtype: Iterator[dict]
+       the start, the target, the cost and the path of each query
+    """
+    if chunk_size < 1:
+        raise ValueError('a chunk holds at least one query')
+    block = grid.to_shared_memory()
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(_solve_shared_chunk, block.name,
+                                       queries[start:start + chunk_size],
+                                       algorithm)
+                       for start in range(0, len(queries), chunk_size)]
+            for future in as_completed(futures):
+                for result in future.result():
+                    yield result
+    finally:
+        block.close()
+        block.unlink()
+
+
+def chart_files(paths):
+    """
+    Return the chart files named by <paths>, where a directory stands for
+    the .txt files in it, in order of name
+
+    @type paths: list[str]
+    @rtype: list[str]
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name)
+                         for name in sorted(os.listdir(path))
+                         if name.endswith('.txt'))
+        else:
+            files.append(path)
+    return files
+
+
+def solve_charts(file_paths, algorithm='astar', workers=None,
+                 chunk_size=CHUNK_SIZE):
+    """
+    Yield the result of solve_chart for every file in file_paths, in the
+    order the chunks finish
+
+    @type file_paths: list[str]
+    @type algorithm: str
+       see Grid.find_path
+    @type workers: int, None
+       the number of worker processes, or None for one per processor;
+       with a single worker the charts are solved in this process
+    @type chunk_size: int
+       the number of charts sent to a worker at a time
+    @rtype: Iterator[dict]
+    """
+    if chunk_size < 1:
+        raise ValueError('a chunk holds at least one chart')
+    chunks = [file_paths[start:start + chunk_size]
+              for start in range(0, len(file_paths), chunk_size)]
+    if workers == 1:
+        for chunk in chunks:
+            for result in _solve_chunk(chunk, algorithm):
+                yield result
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_solve_chunk, chunk, algorithm)
+                   for chunk in chunks]
+        for future in as_completed(futures):
+            for result in future.result():
+                yield result
+
+
+def main(argv=None, out=None):
+    """
+    Solve the charts named on the command line <argv> and write one line
+    of JSON per chart to <out>
+
+    @type argv: list[str], None
+       the arguments, or None for those of this process
+    @type out: TextIO, None
+       the stream to write to, or None for standard output
+    @rtype: None
+    """
+    parser = argparse.ArgumentParser(
+        description='Find the path to the treasure on many charts.')
+    parser.add_argument('paths', nargs='+',
+                        help='chart files, or directories of .txt charts')
+    parser.add_argument('--algorithm', default='astar',
+                        help='the search algorithm of Grid.find_path')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes, one per processor if unset')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='charts sent to a worker at a time')
+    args = parser.parse_args(argv)
+    if out is None:
+        out = sys.stdout
+    for result in solve_charts(chart_files(args.paths), args.algorithm,
+                               args.workers, args.chunk_size):
+        out.write(json.dumps(result) + '\n')
+        # stream each result out as soon as it is known
+        out.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,8 @@ Your only task here is to implement the add method for PriorityQueue,
 according to its docstring.
 """
 
+import functools
+
 
 class Container:
     """A container that holds Objects.
@@ -151,6 +153,24 @@ class PriorityQueue(Container):
         """
         return self._queue.pop()
 
+    def peek(self):
+        """Return the next item of this PriorityQueue without removing it.
+
+        Precondition: this priority queue is non-empty.
+
+        @type self: PriorityQueue
+        @rtype: Object
+
+        >>> pq = PriorityQueue(lambda a, b: a < b)
+        >>> pq.add('fred')
+        >>> pq.add('arju')
+        >>> pq.peek()
+        'arju'
+        >>> pq.remove()
+        'arju'
+        """
+        return self._queue[-1]
+
     def is_empty(self):
         """Return True iff this PriorityQueue is empty.
 
@@ -171,6 +191,386 @@ class PriorityQueue(Container):
         return not self._queue
 
 
+class HeapPriorityQueue(PriorityQueue):
+    """A PriorityQueue backed by a binary heap.
+
+    Items are removed in the same FIFO-priority order as PriorityQueue,
+    but add and remove take O(log n) time instead of O(n).  Ties are
+    resolved with an insertion counter: among items that are not
+    less_than each other, the one added first is removed first.
+
+    For FIFO tie-breaking to hold, less_than should be a strict
+    ordering (like < rather than <=).
+
+    === Private Attributes ===
+    @type _heap: List[List]
+      A binary heap of [count, item] entries; _heap[0] is the entry
+      of the next item to be removed.
+    @type _counter: int
+      The number of items added so far, used as the insertion stamp.
+    @type _less_than: Callable[[Object, Object], bool]
+      If x._less_than(y) is true, then x has higher priority than y
+      and should be removed from the queue before y.
+
+    === Representation Invariants ===
+    - no entry of _heap goes before its parent, that is,
+      _before(_heap[i], _heap[(i - 1) // 2]) is False for every i > 0
+    """
+
+    def __init__(self, less_than):
+        """Initialize this to an empty HeapPriorityQueue.
+
+        @type self: HeapPriorityQueue
+        @type less_than: Callable[[Object, Object], bool]
+            Determines the relative priority of two elements of the queue.
+            If x._less_than(y) is true, then x has higher priority than y.
+        @rtype: None
+        """
+        self._less_than = less_than
+        self._heap = []
+        self._counter = 0
+
+    @property
+    def _queue(self):
+        """Return the items of this queue in PriorityQueue._queue order.
+
+        The end of the list is the front of the queue.  This is O(n log n)
+        and only meant for inspection and testing.
+
+        @type self: HeapPriorityQueue
+        @rtype: List
+        """
+        return [entry[1] for entry in sorted(
+            self._heap, key=functools.cmp_to_key(self._compare),
+            reverse=True)]
+
+    def _before(self, entry, other):
+        """Return True iff the item of <entry> is removed before <other>'s.
+
+        @type self: HeapPriorityQueue
+        @type entry: List
+        @type other: List
+        @rtype: bool
+        """
+        # on a tie the one added first goes first, so the one added later
+        # needs priority and the other only needs to not lose it
+        if entry[0] < other[0]:
+            return not self._less_than(other[1], entry[1])
+        return self._less_than(entry[1], other[1])
+
+    def _compare(self, entry, other):
+        """Return a negative number iff <entry> is removed before <other>.
+
+        @type self: HeapPriorityQueue
+        @type entry: List
+        @type other: List
+        @rtype: int
+        """
+        return -1 if self._before(entry, other) else 1
+
+    def _place(self, pos, entry):
+        """Store <entry> at position <pos> of the heap.
+
+        @type self: HeapPriorityQueue
+        @type pos: int
+        @type entry: List
+        @rtype: None
+        """
+        self._heap[pos] = entry
+
+    def _sift_up(self, pos):
+        """Move the entry at <pos> up until its parent goes before it.
+
+        @type self: HeapPriorityQueue
+        @type pos: int
+        @rtype: None
+        """
+        heap = self._heap
+        entry = heap[pos]
+        while pos > 0:
+            parent_pos = (pos - 1) >> 1
+            parent = heap[parent_pos]
+            if not self._before(entry, parent):
+                break
+            self._place(pos, parent)
+            pos = parent_pos
+        self._place(pos, entry)
+
+    def _sift_down(self, pos):
+        """Move the entry at <pos> down until it goes before its children.
+
+        @type self: HeapPriorityQueue
+        @type pos: int
+        @rtype: None
+        """
+        heap = self._heap
+        size = len(heap)
+        entry = heap[pos]
+        child_pos = 2 * pos + 1
+        while child_pos < size:
+            # pick the child that goes first
+            right_pos = child_pos + 1
+            if (right_pos < size and
+                    self._before(heap[right_pos], heap[child_pos])):
+                child_pos = right_pos
+            if not self._before(heap[child_pos], entry):
+                break
+            self._place(pos, heap[child_pos])
+            pos = child_pos
+            child_pos = 2 * pos + 1
+        self._place(pos, entry)
+
+    def add(self, item):
+        """Add <item> to this HeapPriorityQueue.
+
+        @type self: HeapPriorityQueue
+        @type item: Object
+        @rtype: None
+
+        >>> def shorter(a, b):
+        ...    return len(a) < len(b)
+        ...
+        >>> pq = HeapPriorityQueue(shorter)
+        >>> pq.add('fred')
+        >>> pq.add('arju')
+        >>> pq.add('monalisa')
+        >>> pq.add('hat')
+        >>> pq._queue
+        ['monalisa', 'arju', 'fred', 'hat']
+        """
+        self._heap.append([self._counter, item])
+        self._counter += 1
+        self._sift_up(len(self._heap) - 1)
+
+    def remove(self):
+        """Remove and return the next item from this HeapPriorityQueue.
+
+        Precondition: this priority queue is non-empty.
+
+        @type self: HeapPriorityQueue
+        @rtype: Object
+
+        >>> def shorter(a, b):
+        ...    return len(a) < len(b)
+        ...
+        >>> pq = HeapPriorityQueue(shorter)
+        >>> for word in ['fred', 'arju', 'monalisa', 'hat']:
+        ...     pq.add(word)
+        >>> [pq.remove() for _ in range(4)]
+        ['hat', 'fred', 'arju', 'monalisa']
+        """
+        heap = self._heap
+        last = heap.pop()
+        if not heap:
+            return last[1]
+        # move the last entry to the top and let it sink into place
+        first = heap[0]
+        heap[0] = last
+        self._sift_down(0)
+        return first[1]
+
+    def peek(self):
+        """Return the next item of this HeapPriorityQueue without removing
+        it.
+
+        Precondition: this priority queue is non-empty.
+
+        @type self: HeapPriorityQueue
+        @rtype: Object
+
+        >>> pq = HeapPriorityQueue(lambda a, b: a < b)
+        >>> pq.add('fred')
+        >>> pq.add('arju')
+        >>> pq.peek()
+        'arju'
+        """
+        return self._heap[0][1]
+
+    def is_empty(self):
+        """Return True iff this HeapPriorityQueue is empty.
+
+        @type self: HeapPriorityQueue
+        @rtype: bool
+
+        >>> pq = HeapPriorityQueue(lambda a, b: a < b)
+        >>> pq.is_empty()
+        True
+        >>> pq.add('fred')
+        >>> pq.is_empty()
+        False
+        """
+        return not self._heap
+
+
+class IndexedPriorityQueue(HeapPriorityQueue):
+    """A HeapPriorityQueue that can find, reprioritize and drop its items.
+
+    The queue remembers where each item sits in the heap, so an item whose
+    priority has changed can be moved into place with update, and an item
+    can be taken out with discard, both in O(log n) time.  Entries are
+    removed from the heap as soon as they are discarded or updated, so the
+    heap never holds stale copies that remove would have to skip.
+
+    Items must be hashable, and an item can be in the queue at most once.
+
+    === Private Attributes ===
+    @type _positions: Dict[Object, int]
+      Maps each item in the queue to the index of its entry in _heap.
+
+    === Representation Invariants ===
+    - _heap[_positions[item]][1] == item for every item in _positions
+    - len(_positions) == len(_heap)
+    """
+
+    def __init__(self, less_than):
+        """Initialize this to an empty IndexedPriorityQueue.
+
+        @type self: IndexedPriorityQueue
+        @type less_than: Callable[[Object, Object], bool]
+        @rtype: None
+        """
+        HeapPriorityQueue.__init__(self, less_than)
+        self._positions = {}
+
+    def _place(self, pos, entry):
+        """Store <entry> at position <pos> of the heap and remember it.
+
+        @type self: IndexedPriorityQueue
+        @type pos: int
+        @type entry: List
+        @rtype: None
+        """
+        self._heap[pos] = entry
+        self._positions[entry[1]] = pos
+
+    def add(self, item):
+        """Add <item> to this IndexedPriorityQueue.
+
+        If <item> is already in the queue, it is updated instead.
+
+        @type self: IndexedPriorityQueue
+        @type item: Object
+        @rtype: None
+        """
+        if item in self._positions:
+            self.update(item)
+            return
+        self._heap.append(None)
+        self._place(len(self._heap) - 1, [self._counter, item])
+        self._counter += 1
+        self._sift_up(len(self._heap) - 1)
+
+    def remove(self):
+        """Remove and return the next item from this IndexedPriorityQueue.
+
+        Precondition: this priority queue is non-empty.
+
+        @type self: IndexedPriorityQueue
+        @rtype: Object
+
+        >>> pq = IndexedPriorityQueue(lambda a, b: len(a) < len(b))
+        >>> for word in ['fred', 'arju', 'monalisa', 'hat']:
+        ...     pq.add(word)
+        >>> [pq.remove() for _ in range(4)]
+        ['hat', 'fred', 'arju', 'monalisa']
+        """
+        item = HeapPriorityQueue.remove(self)
+        del self._positions[item]
+        return item
+
+    def contains(self, item):
+        """Return True iff <item> is in this IndexedPriorityQueue.
+
+        @type self: IndexedPriorityQueue
+        @type item: Object
+        @rtype: bool
+
+        >>> pq = IndexedPriorityQueue(lambda a, b: a < b)
+        >>> pq.add(3)
+        >>> pq.contains(3), pq.contains(4)
+        (True, False)
+        """
+        return item in self._positions
+
+    def update(self, item):
+        """Move <item> to its place after its priority has changed.
+
+        The item counts as newly added for FIFO tie-breaking.
+
+        Precondition: <item> is in this queue.
+
+        @type self: IndexedPriorityQueue
+        @type item: Object
+        @rtype: None
+
+        >>> cost = {'a': 5, 'b': 3, 'c': 4}
+        >>> pq = IndexedPriorityQueue(lambda x, y: cost[x] < cost[y])
+        >>> for key in 'abc':
+        ...     pq.add(key)
+        >>> cost['a'] = 1
+        >>> pq.update('a')
+        >>> [pq.remove() for _ in range(3)]
+        ['a', 'b', 'c']
+        """
+        pos = self._positions[item]
+        self._heap[pos][0] = self._counter
+        self._counter += 1
+        self._sift_up(pos)
+        # if it did not move up, its priority may have dropped instead
+        self._sift_down(self._positions[item])
+
+    def discard(self, item):
+        """Remove <item> from this IndexedPriorityQueue if it is there.
+
+        @type self: IndexedPriorityQueue
+        @type item: Object
+        @rtype: None
+
+        >>> pq = IndexedPriorityQueue(lambda a, b: a < b)
+        >>> for number in [4, 1, 3]:
+        ...     pq.add(number)
+        >>> pq.discard(1)
+        >>> pq.discard(7)
+        >>> [pq.remove() for _ in range(2)]
+        [3, 4]
+        """
+        pos = self._positions.pop(item, None)
+        if pos is None:
+            return
+        heap = self._heap
+        last = heap.pop()
+        if pos == len(heap):
+            return
+        # fill the hole with the last entry and restore the heap order
+        self._place(pos, last)
+        self._sift_up(pos)
+        self._sift_down(self._positions[last[1]])
+
+
+# the PriorityQueue implementations that can be selected by name
+PRIORITY_QUEUE_ENGINES = {
+    'list': PriorityQueue,
+    'heap': HeapPriorityQueue,
+    'indexed': IndexedPriorityQueue,
+}
+
+
+def make_priority_queue(less_than, engine='heap'):
+    """Return a new, empty priority queue using the named <engine>.
+
+    @type less_than: Callable[[Object, Object], bool]
+    @type engine: str
+        one of the keys of PRIORITY_QUEUE_ENGINES
+    @rtype: PriorityQueue
+
+    >>> type(make_priority_queue(lambda a, b: a < b)).__name__
+    'HeapPriorityQueue'
+    >>> type(make_priority_queue(lambda a, b: a < b, 'list')).__name__
+    'PriorityQueue'
+    """
+    return PRIORITY_QUEUE_ENGINES[engine](less_than)
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
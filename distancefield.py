@@ -0,0 +1,286 @@
+"""Distance field
+
+This module contains the DistanceField class, the exact distance from
+every cell of a Grid to one fixed target, together with the first move of
+a shortest path from each cell towards it.
+
+In a game the treasure never moves, so one backward search from it
+answers every later PLOT: the path from wherever the boat is now is read
+off the field one move at a time, without searching again.
+"""
+
+import heapq
+from array import array
+
+from grid import NEIGHBOUR_DELTAS
+
+# the distance of a cell from which the target cannot be reached
+UNREACHABLE = -1
+
+# the next move of the target and of cells that cannot reach it
+_NO_MOVE = 255
+
+# _OPPOSITE[k] is the index of the move undoing NEIGHBOUR_DELTAS[k]
+_OPPOSITE = bytes(NEIGHBOUR_DELTAS.index((-delta_x, -delta_y, step))
+                  for delta_x, delta_y, step in NEIGHBOUR_DELTAS)
+
+
+class DistanceField:
+    """
+    The distances from every navigable cell of a grid to a target node
+
+    === Attributes ===
+    @type grid: Grid
+       the grid the field was built on
+    @type target: Node
+       the node every distance is measured to
+    @type distances: array[int]
+       distances[y * width + x] is the cost of a shortest path from
+       (x, y) to the target, in the units of Node.distance, or UNREACHABLE
+    @type _next: bytearray
+       _next[y * width + x] is the index in NEIGHBOUR_DELTAS of the first
+       move of a shortest path from (x, y) to the target, or _NO_MOVE
+    @type _links: tuple[tuple[(int, int, int, int)]]
+       _links[mask] lists (index offset, cost, move, move back) of the
+       moves whose bits are set in an adjacency mask
+    """
+
+    def __init__(self, grid, target_node=None):
+        """
+        Build the distance field of <grid> towards <target_node>, or
+        towards the treasure if target_node is None
+
+        @type self: DistanceField
+        @type grid: Grid
+        @type target_node: Node, None
+        @rtype: None
+
+        >>> from grid import Grid
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> field = DistanceField(g)
+        >>> list(field.distances)
+        [38, 28, -1, -1, 34, -1, 14, 10, 30, 20, 10, 0]
+        """
+        if target_node is None:
+            target_node = grid.treasure
+        self.grid = grid
+        self.target = target_node
+        width = grid.width
+        size = width * grid.height
+        # a signed 32-bit array is four bytes per cell on every platform
+        self.distances = array('i', [UNREACHABLE]) * size
+        self._next = bytearray([_NO_MOVE]) * size
+        _, moves = grid.neighour_index()
+        # pair each move with the move back, which the reached cell takes
+        self._links = tuple(
+            tuple((delta, step, bit, _OPPOSITE[bit])
+                  for (delta, step, _, _), bit
+                  in zip(moves[mask], [bit for bit in range(8)
+                                       if mask >> bit & 1]))
+            for mask in range(256))
+        self._build(target_node.grid_y * width + target_node.grid_x)
+        grid.subscribe(self)
+
+    def _build(self, target):
+        """
+        Fill the field by running Dijkstra backwards from cell <target>
+
+        Moves only end on navigable cells, so the search leaves the
+        target only if it is navigable, and only through navigable cells.
+
+        @type self: DistanceField
+        @type target: int
+        @rtype: None
+        """
+        self.distances[target] = 0
+        if self.grid.navigability()[target]:
+            self._spread([(0, target)])
+
+    def _spread(self, frontier):
+        """
+        Run Dijkstra backwards from the navigable cells on <frontier>,
+        lowering the distance of every cell it reaches a shorter way
+
+        @type self: DistanceField
+        @type frontier: list[(int, int)]
+           a heap of (distance, cell) pairs
+        @rtype: None
+        """
+        distances = self.distances
+        next_move = self._next
+        links = self._links
+        # the adjacency of a navigable cell lists exactly the navigable
+        # cells with a move onto it, so it serves the backward search too
+        adjacency, _ = self.grid.neighour_index()
+        while frontier:
+            cost, curr = heapq.heappop(frontier)
+            if cost > distances[curr]:
+                continue
+            for delta, step, _, back in links[adjacency[curr]]:
+                index = curr + delta
+                new_cost = cost + step
+                if (distances[index] == UNREACHABLE or
+                        new_cost < distances[index]):
+                    distances[index] = new_cost
+                    next_move[index] = back
+                    heapq.heappush(frontier, (new_cost, index))
+
+    def update_cells(self, cells):
+        """
+        Repair the field after the navigability of <cells> has changed
+
+        Only the cells whose shortest path ran through a cell that became
+        land, and the cells a new navigable cell brings closer, are
+        worked out again.  The grid calls this on every field built on it.
+
+        @type self: DistanceField
+        @type cells: iterable[(int, int)]
+           the coordinates of the cells that changed
+        @rtype: None
+
+        >>> from grid import Grid
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> field = DistanceField(g)
+        >>> g.set_navigable(1, 0, False)
+        >>> field.distance(g.boat)
+        44
+        >>> g.set_navigable(1, 1, True)
+        >>> field.distance(g.boat)
+        38
+        """
+        grid = self.grid
+        width = grid.width
+        height = grid.height
+        navigable = grid.navigability()
+        distances = self.distances
+        next_move = self._next
+        changed = [y * width + x for x, y in cells]
+        target = self.target.grid_y * width + self.target.grid_x
+        if target in changed:
+            # every distance goes through the target
+            for index in range(len(distances)):
+                distances[index] = UNREACHABLE
+                next_move[index] = _NO_MOVE
+            self._build(target)
+            return
+        # drop every cell whose moves lead through a cell now land
+        dropped = [index for index in changed
+                   if not navigable[index] and
+                   distances[index] != UNREACHABLE]
+        seen = set(dropped)
+        for cell in dropped:
+            cell_x = cell % width
+            cell_y = cell // width
+            for bit, (delta_x, delta_y, _) in enumerate(NEIGHBOUR_DELTAS):
+                from_x = cell_x - delta_x
+                from_y = cell_y - delta_y
+                if 0 <= from_x < width and 0 <= from_y < height:
+                    index = from_y * width + from_x
+                    if next_move[index] == bit and index not in seen:
+                        seen.add(index)
+                        dropped.append(index)
+        for index in dropped:
+            distances[index] = UNREACHABLE
+            next_move[index] = _NO_MOVE
+        # restart the cells that lost their way, and the new water, from
+        # the best neighour that still has a distance
+        adjacency, _ = grid.neighour_index()
+        frontier = []
+        for index in dropped + [index for index in changed
+                                if navigable[index]]:
+            if not navigable[index]:
+                continue
+            for delta, step, bit, _ in self._links[adjacency[index]]:
+                cost = distances[index + delta]
+                if cost != UNREACHABLE and (
+                        distances[index] == UNREACHABLE or
+                        cost + step < distances[index]):
+                    distances[index] = cost + step
+                    next_move[index] = bit
+            if distances[index] != UNREACHABLE:
+                frontier.append((distances[index], index))
+        heapq.heapify(frontier)
+        self._spread(frontier)
+
+    def distance(self, node):
+        """
+        Return the cost of a shortest path from <node> to the target, or
+        None if there is no path
+
+        @type self: DistanceField
+        @type node: Node
+        @rtype: int, None
+
+        >>> from grid import Grid
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> DistanceField(g).distance(g.boat)
+        38
+        """
+        cost = self.distances[node.grid_y * self.grid.width + node.grid_x]
+        return None if cost == UNREACHABLE else cost
+
+    def next_node(self, node):
+        """
+        Return the node after <node> on a shortest path to the target, or
+        None if node is the target or cannot reach it
+
+        @type self: DistanceField
+        @type node: Node
+        @rtype: Node, None
+        """
+        move = self._next[node.grid_y * self.grid.width + node.grid_x]
+        if move == _NO_MOVE:
+            return None
+        delta_x, delta_y, _ = NEIGHBOUR_DELTAS[move]
+        return self.grid.map[node.grid_x + delta_x][node.grid_y + delta_y]
+
+    def path(self, start_node):
+        """
+        Return the nodes of a shortest path from start_node to the target,
+        in the format of Grid.retrace_path, or [] if there is none
+
+        @type self: DistanceField
+        @type start_node: Node
+        @rtype: list[Node]
+
+        >>> from grid import Grid
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> [(n.grid_x, n.grid_y) for n in DistanceField(g).path(g.boat)]
+        [(0, 0), (1, 0), (2, 1), (3, 2)]
+        """
+        if self.distance(start_node) is None:
+            return []
+        width = self.grid.width
+        next_move = self._next
+        grid_map = self.grid.map
+        x = start_node.grid_x
+        y = start_node.grid_y
+        path = [start_node]
+        move = next_move[y * width + x]
+        # follow the moves, which always lead one step closer
+        while move != _NO_MOVE:
+            delta_x, delta_y, _ = NEIGHBOUR_DELTAS[move]
+            x += delta_x
+            y += delta_y
+            path.append(grid_map[x][y])
+            move = next_move[y * width + x]
+        return path
+
+    def plot_path(self, start_node):
+        """
+        Return a string representation of the grid map with a shortest
+        path from start_node to the target drawn in "*", as
+        Grid.plot_path
+
+        @type self: DistanceField
+        @type start_node: Node
+        @rtype: str
+
+        >>> from grid import Grid
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> print(DistanceField(g).plot_path(g.boat))
+        B*++
+        .+*.
+        ...T
+        """
+        return self.grid.render(self.path(start_node))
@@ -0,0 +1,303 @@
+"""Incremental replanning
+
+This module contains the DStarLite class, an incremental planner that
+keeps shortest paths from a moving start to a fixed target up to date.
+
+The planner searches backwards from the target, so the costs it has
+worked out stay valid when the start moves: after the boat takes a step,
+only the cells whose priority depends on the new start position are
+looked at again.  When cells change navigability, only the cells whose
+costs depended on them are repaired.  See Koenig and Likhachev, "D* Lite",
+AAAI 2002.
+"""
+
+from container import IndexedPriorityQueue
+from grid import NO_COST, NEIGHBOUR_DELTAS, octile
+
+
+class DStarLite:
+    """
+    Shortest paths to a target node from a start that moves
+
+    === Attributes ===
+    @type grid: Grid
+       the grid the planner runs on
+    @type target: Node
+       the node every path leads to
+    @type start: int
+       the index y * width + x of the current start cell, or -1 before
+       the first path is asked for
+    @type expanded: int
+       the number of cells expanded since the planner was created
+    @type _gcost: dict[int, int]
+       the cost to the target of each cell, as last expanded
+    @type _rhs: dict[int, int]
+       the cost to the target of each cell, one move ahead of _gcost
+    @type _keys: dict[int, (int, int)]
+       the priority of each cell in _queue
+    @type _queue: IndexedPriorityQueue
+       the cells whose _gcost and _rhs disagree
+    @type _shift: int
+       the sum of the distances the start has moved, added to new keys
+       so the keys already queued stay valid lower bounds
+    @type _last_start: int
+       the start cell when _shift was last increased
+    @type _target_index: int
+       the index of the target cell
+    """
+
+    def __init__(self, grid, target_node=None):
+        """
+        Create a planner towards <target_node>, or towards the treasure
+        if target_node is None
+
+        No search is run until the first path is asked for.
+
+        @type self: DStarLite
+        @type grid: Grid
+        @type target_node: Node, None
+        @rtype: None
+        """
+        if target_node is None:
+            target_node = grid.treasure
+        self.grid = grid
+        self.target = target_node
+        self.start = -1
+        self.expanded = 0
+        target = target_node.grid_y * grid.width + target_node.grid_x
+        self._gcost = {}
+        self._rhs = {target: 0}
+        self._keys = {}
+        keys = self._keys
+        self._queue = IndexedPriorityQueue(lambda a, b: keys[a] < keys[b])
+        self._shift = 0
+        self._last_start = -1
+        self._target_index = target
+        grid.subscribe(self)
+
+    def _heuristic(self, cell):
+        """
+        Return the octile distance from the start to <cell>
+
+        @type self: DStarLite
+        @type cell: int
+        @rtype: int
+        """
+        width = self.grid.width
+        return octile(cell % width - self.start % width,
+                      cell // width - self.start // width)
+
+    def _key(self, cell):
+        """
+        Return the priority of <cell> for the current start
+
+        @type self: DStarLite
+        @type cell: int
+        @rtype: (int, int)
+        """
+        best = min(self._gcost.get(cell, NO_COST),
+                   self._rhs.get(cell, NO_COST))
+        if best == NO_COST:
+            return (NO_COST, NO_COST)
+        return (best + self._heuristic(cell) + self._shift, best)
+
+    def _predecessors(self, cell):
+        """
+        Return the (cell, cost) of every move that ends on <cell>
+
+        @type self: DStarLite
+        @type cell: int
+        @rtype: list[(int, int)]
+        """
+        if not self.grid.navigability()[cell]:
+            return []
+        adjacency, moves = self.grid.neighour_index()
+        # the navigable neighours of a navigable cell can all move onto it
+        return [(cell + delta, step)
+                for delta, step, _, _ in moves[adjacency[cell]]]
+
+    def _update(self, cell):
+        """
+        Work out the rhs of <cell> again and queue it if it is now
+        inconsistent
+
+        @type self: DStarLite
+        @type cell: int
+        @rtype: None
+        """
+        if cell != self._target_index:
+            adjacency, moves = self.grid.neighour_index()
+            gcost = self._gcost
+            best = NO_COST
+            for delta, step, _, _ in moves[adjacency[cell]]:
+                cost = gcost.get(cell + delta, NO_COST)
+                if cost != NO_COST and cost + step < best:
+                    best = cost + step
+            self._rhs[cell] = best
+        queue = self._queue
+        if self._gcost.get(cell, NO_COST) != self._rhs.get(cell, NO_COST):
+            self._keys[cell] = self._key(cell)
+            # add moves a queued cell to its new place
+            queue.add(cell)
+        elif queue.contains(cell):
+            queue.discard(cell)
+            del self._keys[cell]
+
+    def _repair(self):
+        """
+        Expand inconsistent cells until the cost of the start is exact
+
+        @type self: DStarLite
+        @rtype: None
+        """
+        queue = self._queue
+        keys = self._keys
+        gcost = self._gcost
+        rhs = self._rhs
+        start = self.start
+        while not queue.is_empty():
+            top = queue.peek()
+            if (keys[top] >= self._key(start) and
+                    rhs.get(start, NO_COST) == gcost.get(start, NO_COST)):
+                break
+            new_key = self._key(top)
+            if keys[top] < new_key:
+                # the start moved since top was queued
+                keys[top] = new_key
+                queue.update(top)
+                continue
+            queue.remove()
+            del keys[top]
+            self.expanded += 1
+            if gcost.get(top, NO_COST) > rhs.get(top, NO_COST):
+                gcost[top] = rhs[top]
+                for cell, _ in self._predecessors(top):
+                    self._update(cell)
+            else:
+                gcost[top] = NO_COST
+                self._update(top)
+                for cell, _ in self._predecessors(top):
+                    self._update(cell)
+
+    def _move_start(self, start_node):
+        """
+        Make start_node the start of the paths to plan
+
+        @type self: DStarLite
+        @type start_node: Node
+        @rtype: None
+        """
+        start = start_node.grid_y * self.grid.width + start_node.grid_x
+        if self.start < 0:
+            self.start = self._last_start = start
+            self._keys[self._target_index] = self._key(self._target_index)
+            self._queue.add(self._target_index)
+        elif start != self.start:
+            self.start = start
+            self._shift += self._heuristic(self._last_start)
+            self._last_start = start
+
+    def update_cells(self, cells):
+        """
+        Repair the plan after the navigability of <cells> has changed
+
+        The grid calls this on every planner built on it.  The work is
+        done by the next call to distance or path.
+
+        @type self: DStarLite
+        @type cells: iterable[(int, int)]
+           the coordinates of the cells that changed
+        @rtype: None
+        """
+        if self.start < 0:
+            return
+        grid = self.grid
+        width = grid.width
+        for x, y in cells:
+            # the moves onto (x, y) appeared or went, which changes the
+            # rhs of every neighour, and the cell itself may now be used
+            self._update(y * width + x)
+            for delta_x, delta_y, _ in NEIGHBOUR_DELTAS:
+                if 0 <= x + delta_x < width and 0 <= y + delta_y < grid.height:
+                    self._update((y + delta_y) * width + x + delta_x)
+
+    def distance(self, start_node):
+        """
+        Return the cost of a shortest path from start_node to the target,
+        or None if there is none
+
+        @type self: DStarLite
+        @type start_node: Node
+        @rtype: int, None
+
+        >>> from grid import Grid
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> DStarLite(g).distance(g.boat)
+        38
+        """
+        self._move_start(start_node)
+        # the labels answer for other bodies of water without a search
+        if not self.grid.reachable(start_node, self.target):
+            return None
+        self._repair()
+        cost = self._gcost.get(self.start, NO_COST)
+        return None if cost == NO_COST else cost
+
+    def path(self, start_node):
+        """
+        Return the nodes of a shortest path from start_node to the target,
+        in the format of Grid.retrace_path, or [] if there is none
+
+        @type self: DStarLite
+        @type start_node: Node
+        @rtype: list[Node]
+
+        >>> from grid import Grid
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> planner = DStarLite(g)
+        >>> [(n.grid_x, n.grid_y) for n in planner.path(g.boat)]
+        [(0, 0), (1, 0), (2, 1), (3, 2)]
+        >>> g.move('E')
+        >>> [(n.grid_x, n.grid_y) for n in planner.path(g.boat)]
+        [(1, 0), (2, 1), (3, 2)]
+        """
+        if self.distance(start_node) is None:
+            return []
+        adjacency, moves = self.grid.neighour_index()
+        width = self.grid.width
+        grid_map = self.grid.map
+        gcost = self._gcost
+        cell = self.start
+        path = [start_node]
+        # step to the neighour that leaves the least cost to go
+        while cell != self._target_index:
+            best = NO_COST
+            for delta, step, _, _ in moves[adjacency[cell]]:
+                cost = gcost.get(cell + delta, NO_COST)
+                if cost != NO_COST and cost + step < best:
+                    best = cost + step
+                    next_cell = cell + delta
+            if best == NO_COST:
+                return []
+            cell = next_cell
+            path.append(grid_map[cell % width][cell // width])
+        return path
+
+    def plot_path(self, start_node):
+        """
+        Return a string representation of the grid map with a shortest
+        path from start_node to the target drawn in "*", as
+        Grid.plot_path
+
+        @type self: DStarLite
+        @type start_node: Node
+        @rtype: str
+
+        >>> from grid import Grid
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> print(DStarLite(g).plot_path(g.boat))
+        B*++
+        .+*.
+        ...T
+        """
+        return self.grid.render(self.path(start_node))
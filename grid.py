@@ -8,8 +8,421 @@ Also complete the missing doctests.
 """
 
 import functools
+import hashlib
+import mmap
+import os
+import re
+import struct
 import sys
-from container import PriorityQueue
+import weakref
+from array import array
+from multiprocessing import shared_memory
+from container import IndexedPriorityQueue
+
+try:
+    import numpy
+except ImportError:
+    # NumPy is optional, everything has a pure Python path
+    numpy = None
+
+# the gcost and hcost of a node that has not been reached by a search
+NO_COST = sys.maxsize
+
+# the states of a node during a find_path search
+_UNREACHED = 0
+_ON_FRONTIER = 1
+_EXPANDED = 2
+
+# the Grid methods that run each find_path algorithm
+_SEARCH_METHODS = {
+    'astar': '_astar',
+    'jps': '_jump_point_search',
+    'bidirectional': '_bidirectional_astar',
+    'hpa': '_hierarchical',
+}
+
+# the moves to the eight neighours of a cell as (delta_x, delta_y, cost),
+# in the order get_neighours reports them
+NEIGHBOUR_DELTAS = ((0, 1, 10), (0, -1, 10), (1, 0, 10), (-1, 0, 10),
+                    (1, 1, 14), (-1, 1, 14), (1, -1, 14), (-1, -1, 14))
+
+# the bytes of a text row that are not map symbols
+_NOT_A_SYMBOL = bytes(sorted(set(range(256)) - set(b'.+BT')))
+# turns map symbols into navigability bytes: 1 for water, 0 for islands
+_NAVIGABLE_TABLE = bytes.maketrans(b'.+BT', b'\x01\x00\x01\x01')
+# turns navigability bytes back into map symbols
+_SYMBOL_TABLE = bytes.maketrans(b'\x00\x01', b'+.')
+
+
+# the layout of a binary chart: a header, then one bit per cell
+_BINARY_MAGIC = b'RBTG'
+_BINARY_VERSION = 1
+# magic, version, width, height, boat x and y, treasure x and y
+_BINARY_HEADER = struct.Struct('<4sB3xIIiiii')
+# the layout of a shared chart: the header of a binary chart, then the
+# navigability mask and the adjacency masks, one byte per cell each
+_SHARED_MAGIC = b'RBTS'
+_SHARED_VERSION = 1
+# the changes to a chart through which paths cached before them are
+# followed
+_CHANGES_KEPT = 16
+# turn navigability bytes into binary digits and back
+_CELLS_TO_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_DIGITS_TO_CELLS = bytes.maketrans(b'01', b'\x00\x01')
+
+
+def _build_adjacency(navigable, width, height):
+    """
+    Return the neighour masks of every cell of a navigability mask
+
+    Bit k of the mask of a cell is set iff the move NEIGHBOUR_DELTAS[k]
+    from that cell stays on the map and ends on a navigable cell.  The
+    whole table is computed with big integer shifts and masks, each
+    byte of an integer standing for one cell.
+
+    @type navigable: bytearray
+    @type width: int
+    @type height: int
+    @rtype: bytearray
+
+    >>> list(_build_adjacency(bytearray(b'\\x01\\x01\\x00\\x01'), 2, 2))
+    [20, 9, 70, 130]
+    """
+    size = width * height
+    cells = int.from_bytes(navigable, 'little')
+    # the cells that have a column to their left or right
+    has_left = int.from_bytes(
+        (b'\x00' + b'\x01' * (width - 1)) * height, 'little')
+    has_right = int.from_bytes(
+        (b'\x01' * (width - 1) + b'\x00') * height, 'little')
+    on_map = (1 << (8 * size)) - 1
+    adjacency = 0
+    for bit, (delta_x, delta_y, _) in enumerate(NEIGHBOUR_DELTAS):
+        offset = delta_y * width + delta_x
+        # line every cell up with its neighour in this direction
+        if offset > 0:
+            neighours = cells >> (8 * offset)
+        else:
+            neighours = (cells << (-8 * offset)) & on_map
+        if delta_x < 0:
+            neighours &= has_left
+        elif delta_x > 0:
+            neighours &= has_right
+        adjacency |= neighours << bit
+    return bytearray(adjacency.to_bytes(size, 'little'))
+
+
+def _move_table(width):
+    """
+    Return the moves of every adjacency mask on a grid <width> cells wide
+
+    @type width: int
+    @rtype: tuple[tuple[(int, int, int, int)]]
+        the table indexed by mask of the (index offset, cost, delta x,
+        delta y) of the moves whose bits are set in that mask
+
+    >>> _move_table(4)[5]
+    ((4, 10, 0, 1), (1, 10, 1, 0))
+    """
+    return tuple(
+        tuple((delta_y * width + delta_x, step, delta_x, delta_y)
+              for bit, (delta_x, delta_y, step)
+              in enumerate(NEIGHBOUR_DELTAS) if mask >> bit & 1)
+        for mask in range(256))
+
+
+def _detach_shared(block, views):
+    """
+    Release <views> of the shared memory block <block>, then close it
+
+    @type block: SharedMemory
+    @type views: tuple[memoryview]
+    @rtype: None
+    """
+    for view in views:
+        view.release()
+    block.close()
+
+
+def _label_components(navigable, width, height):
+    """
+    Return the label of the body of water each cell belongs to, 0 for
+    land, counting bodies from 1 in the order their first cell appears
+
+    Each row is cut into runs of navigable cells.  Runs in consecutive
+    rows that touch, diagonally included, are joined with union-find,
+    and every run is then written out with its label in one slice.
+
+    @type navigable: bytearray
+    @type width: int
+    @type height: int
+    @rtype: array[int]
+
+    >>> list(_label_components(bytearray([1, 0, 1,
+    ...                                   0, 0, 1,
+    ...                                   1, 0, 0]), 3, 3))
+    [1, 0, 2, 0, 0, 2, 3, 0, 0]
+    """
+    water = re.compile(b'\x01+')
+    # the row and the first and past-the-end columns of each run,
+    # numbered row by row
+    rows = []
+    starts = []
+    ends = []
+    parent = []
+
+    def find(run):
+        """
+        Return the root of <run>, halving the path on the way
+        @type run: int
+        @rtype: int
+        """
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+    previous = range(0)
+    for grid_y in range(height):
+        first = len(starts)
+        for match in water.finditer(navigable, grid_y * width,
+                                    (grid_y + 1) * width):
+            rows.append(grid_y)
+            starts.append(match.start() - grid_y * width)
+            ends.append(match.end() - grid_y * width)
+            parent.append(len(parent))
+        current = range(first, len(starts))
+        # sweep both rows, joining runs that touch
+        above = iter(previous)
+        run_above = next(above, None)
+        for run in current:
+            while run_above is not None and ends[run_above] < starts[run]:
+                run_above = next(above, None)
+            while run_above is not None and starts[run_above] <= ends[run]:
+                root, root_above = find(run), find(run_above)
+                if root != root_above:
+                    parent[max(root, root_above)] = min(root, root_above)
+                if ends[run_above] > ends[run]:
+                    break
+                run_above = next(above, None)
+        previous = current
+    labels = array('i', bytes(4 * width * height))
+    # a root is the first run of its body, so labels follow first cells
+    names = {}
+    for run, root in enumerate(map(find, range(len(parent)))):
+        label = names.setdefault(root, len(names) + 1)
+        offset = rows[run] * width
+        labels[offset + starts[run]:offset + ends[run]] = (
+            array('i', [label]) * (ends[run] - starts[run]))
+    return labels
+
+
+def _render_numpy(navigable, width, height, path, marks):
+    """
+    Return the text of a grid drawn with NumPy, as Grid.render
+
+    @type navigable: bytearray
+    @type width: int
+    @type height: int
+    @type path: list[int]
+        the indices of the cells drawn as "*"
+    @type marks: list[(int, int)]
+        (index, symbol) pairs drawn last, over the path
+    @rtype: str
+    """
+    lines = numpy.empty((height, width + 1), numpy.uint8)
+    lines[:, width] = ord('\n')
+    # '+' is 43 and '.' is 46, so the symbol of a cell is 43 + 3 * mask
+    cells = lines[:, :width]
+    numpy.multiply(numpy.frombuffer(navigable, numpy.uint8).reshape(
+        height, width), ord('.') - ord('+'), out=cells)
+    cells += ord('+')
+    # scatter the path and the marks, skipping the newline of each line
+    flat = lines.reshape(-1)
+    path = numpy.array(path, numpy.intp)
+    flat[path + path // width] = ord('*')
+    for index, symbol in marks:
+        flat[index + index // width] = symbol
+    return lines.tobytes()[:-1].decode('ascii')
+
+
+def octile(delta_x, delta_y):
+    """
+    Return the distance covered by delta_x and delta_y, as Node.distance
+
+    @type delta_x: int
+    @type delta_y: int
+    @rtype: int
+
+    >>> octile(3, -1)
+    34
+    """
+    delta_x = abs(delta_x)
+    delta_y = abs(delta_y)
+    if delta_x > delta_y:
+        return 14 * delta_y + 10 * (delta_x - delta_y)
+    return 14 * delta_x + 10 * (delta_y - delta_x)
+
+
+def _parse_rows(text_grid):
+    """
+    Parse the rows of a text grid into a navigability mask
+
+    The rows are consumed one at a time and written straight into the
+    mask, so a stream of rows is never held in memory as text.
+    Characters other than the map symbols are dropped and rows without
+    any symbol are skipped.  Rows longer than the shortest row are cut to
+    its width.
+
+    @type text_grid: Iterable[str | bytes]
+    @rtype: (int, int, bytearray, (int, int), (int, int))
+        the width, the height, the mask with one byte per cell in row
+        major order (1 for navigable), and the (x, y) coordinates of the
+        boat and of the treasure, or None for a missing one
+
+    >>> _parse_rows(["B.+", "+.T"])
+    (3, 2, bytearray(b'\\x01\\x01\\x00\\x00\\x01\\x01'), (0, 0), (2, 1))
+    >>> _parse_rows([b"B.+\\n", b"+.\\n", b"..T.\\n"])[:3]
+    (2, 3, bytearray(b'\\x01\\x01\\x00\\x01\\x01\\x01'))
+    """
+    navigable = bytearray()
+    width = None
+    height = 0
+    boat = treasure = None
+    # [rows, width] of each run of rows stored at the same width
+    runs = []
+    # loop the rows that contain any symbol
+    for row in text_grid:
+        if isinstance(row, str):
+            row = row.encode('ascii', 'ignore')
+        row = row.translate(None, _NOT_A_SYMBOL)
+        if not row:
+            continue
+        # remember where the boat and the treasure are
+        if b'B' in row:
+            boat = (row.rindex(b'B'), height)
+        if b'T' in row:
+            treasure = (row.rindex(b'T'), height)
+        # a shorter row starts a run of rows stored at its width
+        if width is None or len(row) < width:
+            width = len(row)
+            runs.append([0, width])
+        navigable += row[:width].translate(_NAVIGABLE_TABLE)
+        runs[-1][0] += 1
+        height += 1
+    if width is None:
+        raise ValueError('the grid has no rows')
+    if len(runs) > 1:
+        # cut the rows stored wider than the last width in a single pass,
+        # walking an offset through the mask
+        cut = bytearray()
+        offset = 0
+        for rows, run_width in runs:
+            for _ in range(rows):
+                cut += navigable[offset:offset + width]
+                offset += run_width
+        navigable = cut
+    return width, height, navigable, boat, treasure
+
+
+def _pack_bits(navigable):
+    """
+    Return the navigability mask <navigable> packed into eight cells a byte
+
+    The first cell of each group of eight goes to the highest bit.
+
+    @type navigable: bytearray | memoryview
+    @rtype: bytes
+
+    >>> _pack_bits(bytearray(b'\\x01\\x00\\x00\\x00\\x00\\x00\\x01\\x01\\x01'))
+    b'\\x83\\x80'
+    """
+    # spell the mask as one big binary number, padded to whole bytes;
+    # CPython converts binary strings and ints in linear time
+    digits = bytes(navigable).translate(_CELLS_TO_DIGITS).decode('ascii')
+    digits += '0' * (-len(navigable) % 8)
+    return int(digits, 2).to_bytes(len(digits) // 8, 'big')
+
+
+def _unpack_bits(bitmap, size):
+    """
+    Return the first <size> cells of the packed mask <bitmap>
+
+    @type bitmap: bytes
+    @type size: int
+    @rtype: bytearray
+
+    >>> _unpack_bits(b'\\x83\\x80', 9)
+    bytearray(b'\\x01\\x00\\x00\\x00\\x00\\x00\\x01\\x01\\x01')
+    """
+    # spell the bitmap as binary digits, then turn those into cells
+    digits = format(int.from_bytes(bitmap, 'big'), '0{}b'.format(
+        8 * len(bitmap)))
+    navigable = bytearray(digits.encode('ascii').translate(_DIGITS_TO_CELLS))
+    del navigable[size:]
+    return navigable
+
+
+def _read_grid_file(grid_file):
+    """
+    Parse the open grid file <grid_file> like _parse_rows
+
+    The file is memory-mapped and parsed one line at a time, so its
+    text is never copied into memory as a whole.  Files that cannot be
+    mapped, such as pipes, are read line by line instead.
+
+    @type grid_file: TextIOWrapper
+    @rtype: (int, int, bytearray, (int, int), (int, int))
+    """
+    try:
+        chart = mmap.mmap(grid_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        # empty or unmappable files
+        return _parse_rows(grid_file)
+    with chart:
+        parsed = None
+        if numpy is not None:
+            parsed = _parse_chart_numpy(chart)
+        if parsed is None:
+            parsed = _parse_rows(iter(chart.readline, b''))
+        return parsed
+
+
+def _parse_chart_numpy(chart):
+    """
+    Parse the whole text chart <chart> at once with NumPy
+
+    This only handles the common layout of equally long rows of map
+    symbols, each ending in a newline, and returns None for anything
+    else so that the caller can fall back to _parse_rows.
+
+    @type chart: mmap
+    @rtype: (int, int, bytearray, (int, int), (int, int)), None
+    """
+    width = chart.find(b'\n')
+    size = len(chart)
+    if width <= 0 or size % (width + 1):
+        return None
+    height = size // (width + 1)
+    lines = numpy.frombuffer(chart, numpy.uint8).reshape(height, width + 1)
+    cells = lines[:, :width]
+    if not (lines[:, width] == ord('\n')).all():
+        return None
+    # every cell must be one of the map symbols
+    islands = cells == ord('+')
+    if (numpy.count_nonzero(islands) + numpy.count_nonzero(cells == ord('.'))
+            + numpy.count_nonzero(cells == ord('B'))
+            + numpy.count_nonzero(cells == ord('T')) != cells.size):
+        return None
+    navigable = bytearray((~islands).view(numpy.uint8).tobytes())
+    found = []
+    # the last boat and the last treasure count, as in _parse_rows
+    for symbol in (b'B', b'T'):
+        hits = numpy.flatnonzero(cells == ord(symbol))
+        found.append(divmod(int(hits[-1]), width)[::-1]
+                     if len(hits) else None)
+    # drop the view before the caller closes the chart
+    del lines, cells
+    return width, height, navigable, found[0], found[1]
 
 
 @functools.total_ordering
@@ -55,13 +468,20 @@ class Node:
        in the example above, in_path is True for nodes with coordinates
        (2, 2), (3,1), (3, 0)
        and False for all other nodes
-    @type gcost: float
+    @type gcost: int
        gcost of the node, as described in the handout
-       initially, we set it to the largest possible float
-    @type hcost: float
+       initially, we set it to NO_COST, the largest machine integer
+    @type hcost: int
        hcost of the node, as described in the handout
-       initially, we set it to the largest possible float
+       initially, we set it to NO_COST, the largest machine integer
+
+    === Private Attributes: ===
+    @type _fcost: int
+       gcost + hcost, kept current by set_gcost and set_hcost so that
+       comparing nodes does not add them up every time
     """
+    __slots__ = ('navigable', 'grid_x', 'grid_y', 'in_path', 'parent',
+                 'gcost', 'hcost', '_fcost')
 
     def __init__(self, navigable, grid_x, grid_y):
         """
@@ -93,14 +513,34 @@ class Node:
         self.in_path = False
         # initialize the parent being none
         self.parent = None
-        self.gcost = sys.float_info.max
-        self.hcost = sys.float_info.max
+        self.gcost = NO_COST
+        self.hcost = NO_COST
+        self._fcost = NO_COST + NO_COST
+
+    def reset(self):
+        """
+        Forget the path search results stored in this node
+
+        @type self: Node
+        @rtype: None
+
+        >>> n = Node(True, 1, 2)
+        >>> n.set_gcost(12)
+        >>> n.reset()
+        >>> n.gcost == NO_COST
+        True
+        """
+        self.in_path = False
+        self.parent = None
+        self.gcost = NO_COST
+        self.hcost = NO_COST
+        self._fcost = NO_COST + NO_COST
 
     def set_gcost(self, gcost):
         """
         Set gcost to a given value
 
-        @type gcost: float
+        @type gcost: int
         @rtype: None
 
         Precondition: gcost is non-negative
@@ -110,14 +550,15 @@ class Node:
         >>> n.gcost
         12.0
         """
-        # set gcost
+        # set gcost, and the fcost with it
         self.gcost = gcost
+        self._fcost = gcost + self.hcost
 
     def set_hcost(self, hcost):
         """
         Set hcost to a given value
 
-        @type hcost: float
+        @type hcost: int
         @rtype: None
 
         Precondition: gcost is non-negative
@@ -127,15 +568,16 @@ class Node:
         >>> n.hcost
         12.0
         """
-        # set hcost
+        # set hcost, and the fcost with it
         self.hcost = hcost
+        self._fcost = self.gcost + hcost
 
     def fcost(self):
         """
         Compute the fcost of this node according to the handout
 
         @type self: Node
-        @rtype: float
+        @rtype: int
 
         >>> n = Node(True, 1, 2)
         >>> n.set_hcost(12.5)
@@ -143,8 +585,8 @@ class Node:
         >>> n.fcost()
         34.0
         """
-        # get the total distance which means f-cost
-        return self.gcost + self.hcost
+        # get the total distance which means f-cost, kept by the setters
+        return self._fcost
 
     def set_parent(self, parent):
         """
@@ -218,6 +660,17 @@ class Node:
             self.grid_y == other.grid_y and
             self.navigable == self.navigable)
 
+    def __hash__(self):
+        """
+        Return a hash value consistent with __eq__.
+
+        @type self: Node
+        @rtype: int
+        >>> hash(Node(True, 1, 2)) == hash(Node(True, 1, 2))
+        True
+        """
+        return hash((self.grid_x, self.grid_y))
+
     def __lt__(self, other):
         """
         Return True if self less than other, and false otherwise.
@@ -239,7 +692,7 @@ class Node:
         """
         # TODO
         # compare the f-cost between self and other
-        return self.fcost() < other.fcost()
+        return self._fcost < other._fcost
 
     def __str__(self):
         """
@@ -273,6 +726,280 @@ class Node:
         return string
 
 
+class SearchState:
+    """
+    The scratch state of path searches over a grid of a given size.
+
+    Every cell has a slot in flat arrays indexed by y * width + x.  A slot
+    only counts as written if its stamp equals the current generation, so
+    starting a new search is O(1): bump the generation and every slot
+    reads as unreached again.  One SearchState can answer any number of
+    queries back to back.
+
+    === Attributes: ===
+    @type generation: int
+       the number of the current search; slots stamped with an older
+       generation are treated as unreached
+    @type gcost: array
+       gcost[i] is the cost of the best path found to cell i
+    @type fcost: array
+       fcost[i] is gcost[i] plus the estimated cost from i to the target
+    @type parent: array
+       parent[i] is the index of the cell before i on that path, or -1
+    @type status: bytearray
+       status[i] is _ON_FRONTIER or _EXPANDED for cells reached in the
+       current generation
+    @type stamp: array
+       stamp[i] is the generation in which cell i was last reached
+    @type touched: list[int]
+       the cells reached in the current generation, in order
+    @type expanded: int
+       the number of cells expanded in the current generation
+
+    === Representation invariants ===
+    - stamp[i] == generation iff i is in touched
+    """
+
+    def __init__(self, size):
+        """
+        Initialize the scratch state for a grid with <size> cells
+
+        @type self: SearchState
+        @type size: int
+        @rtype: None
+
+        >>> s = SearchState(6)
+        >>> s.status_of(4)
+        0
+        """
+        self.generation = 0
+        self.gcost = array('q', bytes(8 * size))
+        self.fcost = array('q', bytes(8 * size))
+        self.parent = array('q', bytes(8 * size))
+        self.status = bytearray(size)
+        self.stamp = array('L', bytes(array('L').itemsize * size))
+        self.touched = []
+        self.expanded = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the previous search in O(1)
+
+        @type self: SearchState
+        @rtype: None
+
+        >>> s = SearchState(6)
+        >>> s.reach(4, 10, 14, -1)
+        >>> s.status_of(4)
+        1
+        >>> s.reset()
+        >>> s.status_of(4)
+        0
+        """
+        self.generation += 1
+        # on the rare wrap-around of the stamps, clear them for real
+        if self.generation >= 1 << (8 * self.stamp.itemsize):
+            self.stamp = array(
+                'L', bytes(self.stamp.itemsize * len(self.stamp)))
+            self.generation = 1
+        self.touched = []
+        self.expanded = 0
+
+    def status_of(self, index):
+        """
+        Return the status of cell <index> in the current search
+
+        @type self: SearchState
+        @type index: int
+        @rtype: int
+            _UNREACHED, _ON_FRONTIER or _EXPANDED
+        """
+        if self.stamp[index] != self.generation:
+            return _UNREACHED
+        return self.status[index]
+
+    def reach(self, index, gcost, hcost, parent):
+        """
+        Record that cell <index> was reached for the first time
+
+        @type self: SearchState
+        @type index: int
+        @type gcost: int
+        @type hcost: int
+        @type parent: int
+            the index of the cell it was reached from, or -1
+        @rtype: None
+        """
+        self.stamp[index] = self.generation
+        self.status[index] = _ON_FRONTIER
+        self.gcost[index] = gcost
+        self.fcost[index] = gcost + hcost
+        self.parent[index] = parent
+        self.touched.append(index)
+
+    def record(self, index, gcost, hcost, parent):
+        """
+        Set the costs and parent of cell <index>, whether or not it was
+        reached before in the current search
+
+        @type self: SearchState
+        @type index: int
+        @type gcost: int
+        @type hcost: int
+        @type parent: int
+        @rtype: None
+
+        >>> s = SearchState(6)
+        >>> s.record(4, 10, 14, -1)
+        >>> s.record(4, 20, 14, 3)
+        >>> s.gcost[4], s.fcost[4], s.parent[4], s.touched
+        (20, 34, 3, [4])
+        """
+        if self.stamp[index] != self.generation:
+            self.reach(index, gcost, hcost, parent)
+        else:
+            self.gcost[index] = gcost
+            self.fcost[index] = gcost + hcost
+            self.parent[index] = parent
+
+
+class _LazyMap:
+    """
+    The map of a compact Grid: map[x][y] creates the Node on first access
+
+    Only the Nodes that are actually used are ever created, and each one
+    is kept so that repeated accesses return the same object.
+
+    === Private Attributes: ===
+    @type _grid: Grid
+       the grid whose navigability mask backs this map
+    @type _nodes: dict[int, Node]
+       the Nodes created so far, by y * width + x
+    """
+
+    def __init__(self, grid):
+        """
+        Initialize an empty lazy map over <grid>
+
+        @type self: _LazyMap
+        @type grid: Grid
+        @rtype: None
+        """
+        self._grid = grid
+        self._nodes = {}
+
+    def node(self, grid_x, grid_y):
+        """
+        Return the Node at (grid_x, grid_y), creating it if needed
+
+        @type self: _LazyMap
+        @type grid_x: int
+        @type grid_y: int
+        @rtype: Node
+        """
+        grid = self._grid
+        index = grid_y * grid.width + grid_x
+        node = self._nodes.get(index)
+        if node is None:
+            node = Node(grid._navigable[index] == 1, grid_x, grid_y)
+            self._nodes[index] = node
+        return node
+
+    def __len__(self):
+        """
+        Return the width of the grid
+
+        @type self: _LazyMap
+        @rtype: int
+        """
+        return self._grid.width
+
+    def __getitem__(self, grid_x):
+        """
+        Return the column of Nodes with x-coordinate grid_x
+
+        @type self: _LazyMap
+        @type grid_x: int
+        @rtype: _LazyColumn
+        """
+        width = self._grid.width
+        if grid_x < 0:
+            grid_x += width
+        if not 0 <= grid_x < width:
+            raise IndexError('map index out of range')
+        return _LazyColumn(self, grid_x)
+
+    def __eq__(self, other):
+        """
+        Return True iff <other> holds equal Nodes in the same places
+
+        @type self: _LazyMap
+        @type other: Sequence[Sequence[Node]]
+        @rtype: bool
+        """
+        return (len(self) == len(other) and
+                all(a == b for a, b in zip(self, other)))
+
+
+class _LazyColumn:
+    """
+    One column of a _LazyMap, that is map[x] for a fixed x
+
+    === Private Attributes: ===
+    @type _map: _LazyMap
+    @type _grid_x: int
+    """
+    __slots__ = ('_map', '_grid_x')
+
+    def __init__(self, lazy_map, grid_x):
+        """
+        Initialize the column of <lazy_map> at x-coordinate grid_x
+
+        @type self: _LazyColumn
+        @type lazy_map: _LazyMap
+        @type grid_x: int
+        @rtype: None
+        """
+        self._map = lazy_map
+        self._grid_x = grid_x
+
+    def __len__(self):
+        """
+        Return the height of the grid
+
+        @type self: _LazyColumn
+        @rtype: int
+        """
+        return self._map._grid.height
+
+    def __getitem__(self, grid_y):
+        """
+        Return the Node with coordinates (x, grid_y) of this column
+
+        @type self: _LazyColumn
+        @type grid_y: int
+        @rtype: Node
+        """
+        height = self._map._grid.height
+        if grid_y < 0:
+            grid_y += height
+        if not 0 <= grid_y < height:
+            raise IndexError('map index out of range')
+        return self._map.node(self._grid_x, grid_y)
+
+    def __eq__(self, other):
+        """
+        Return True iff <other> holds equal Nodes in the same places
+
+        @type self: _LazyColumn
+        @type other: Sequence[Node]
+        @rtype: bool
+        """
+        return (len(self) == len(other) and
+                all(a == b for a, b in zip(self, other)))
+
+
 class Grid:
     """
     Represents the world where the action of the game takes place.
@@ -295,13 +1022,64 @@ class Grid:
        a navigable node in the map, the location of the treasure
     @type boat: Node
        a navigable node in the map, the current location of the boat
+    @type compact: bool
+       True iff map creates its Nodes lazily from the navigability mask
+    @type path_cache: PathCache, None
+       the cache find_path consults before searching, or None to always
+       search; it may be shared by grids loaded from the same chart
+
+
+    === Private Attributes: ===
+    @type _navigable: bytearray | memoryview
+       one byte per cell in row major order, _navigable[y * width + x]
+       is 1 if that cell is navigable and 0 otherwise; a read-only view
+       of shared memory for a grid made by from_shared_memory
+    @type _adjacency: bytearray | memoryview, None
+       _adjacency[y * width + x] has bit k set iff the move
+       NEIGHBOUR_DELTAS[k] from (x, y) leads to a navigable cell,
+       or None until it is first needed
+    @type _shared: weakref.finalize, None
+       detaches this grid from the shared memory block _navigable and
+       _adjacency are views of, or None if they belong to this grid
+    @type _copy_on_write: bool
+       True iff _navigable and _adjacency may be read by other grids, so
+       they must be copied before a cell changes
+    @type _moves: tuple[tuple[(int, int, int, int)]], None
+       _moves[mask] lists (index offset, cost, delta x, delta y) of the
+       moves whose bits are set in an adjacency mask
+    @type _search: SearchState, None
+       the scratch state reused by every find_path on this grid
+    @type _reverse_search: SearchState, None
+       the scratch state of the backward half of bidirectional searches
+    @type _hierarchy: Hierarchy, None
+       the abstract graph used by hierarchical searches
+    @type _fingerprint: bytes, None
+       the digest of the chart, or None until it is first needed
+    @type _changes: list[(bytes, frozenset[int], bool)]
+       the fingerprint before each of the last changes, the indices of
+       the cells changed and whether any became navigable, oldest first
+    @type _listeners: WeakSet
+       the objects whose update_cells is called with the coordinates of
+       the cells that changed navigability, while they are alive
+    @type _components: array[int], None
+       the label of the body of water of each cell, 0 for land, or None
+       until it is first needed
+    @type _merged: list[int]
+       _merged[label] is the label a body was joined to when new water
+       connected it with another, or the label itself; a union-find
+       forest over the labels in _components
+    @type _split: bool
+       True iff cells became land since the chart was labelled, so two
+       cells with the same label may no longer be connected
+    @type _published: list[Node]
+       the nodes on which the last search stored its results
 
     === Representation invariants ===
     - width and height are positive integers
     - map has dimensions width, height
     """
 
-    def __init__(self, file_path, text_grid=None):
+    def __init__(self, file_path, text_grid=None, compact=False):
         """
         If text_grid is None, initialize a new Grid assuming file_path
         contains pathname to a text file with the following format:
@@ -326,106 +1104,411 @@ class Grid:
              is no need for error handling
            Please call open_grid to open the file
         @type text_grid: List[str]
+        @type compact: bool
+           if True, only the navigability of each cell is stored, one
+           byte per cell, and Nodes are created when map[x][y] is first
+           accessed; map[x][y] works the same either way
         @rtype: None
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"], compact=True)
+        >>> g.map[1][1].navigable, g.map[3][2] is g.treasure
+        (False, True)
         """
         # TODO
         # if the text_grid is not none
         if not text_grid:
-            # open the grid file path
-            text_grid = self.open_grid(file_path).readlines()
-        # create an empty list
-        _map = []
-        # loop the element in the grid with index
-        for y, row in enumerate(text_grid):
-            # create an empty list for row
-            map_row = []
-            # loop the element in the row with index
-            for x, sym in enumerate(row):
-                # if the symbol is plus
-                if sym == '+':
-                    # add the node as false to the row
-                    map_row.append(Node(False, x, y))
-                # else if the symbol is not plus
-                elif sym in ('.', 'B', 'T'):
-                    # add the node as true to the row
-                    map_row.append(Node(True, x, y))
-                    # if the symbol is B
-                    if sym == 'B':
-                        self.boat = map_row[-1]
-                    # else if the symbol is T
-                    elif sym == 'T':
-                        self.treasure = map_row[-1]
-            # add the row in the map
-            _map.append(map_row)
-        self.map = list(list(x) for x in zip(*_map))
-        # get the wide length of the map
-        self.width = len(self.map)
-        # get the height of the map
-        self.height = len(self.map[0])
+            # open the grid file path and parse it, closing it when done
+            with self.open_grid(file_path) as grid_file:
+                width, height, navigable, boat, treasure = _read_grid_file(
+                    grid_file)
+        else:
+            # parse the rows into a navigability mask
+            width, height, navigable, boat, treasure = _parse_rows(
+                text_grid)
+        self._setup(width, height, navigable, boat, treasure, compact)
+
+    def _setup(self, width, height, navigable, boat, treasure, compact):
+        """
+        Initialize this grid from its parsed navigability mask
+
+        @type self: Grid
+        @type width: int
+        @type height: int
+        @type navigable: bytearray
+            one byte per cell in row major order, 1 for navigable
+        @type boat: (int, int), None
+            the (x, y) coordinates of the boat
+        @type treasure: (int, int), None
+            the (x, y) coordinates of the treasure
+        @type compact: bool
+        @rtype: None
+        """
+        # get the wide length and the height of the map
+        self.width = width
+        self.height = height
+        self._navigable = navigable
+        self.compact = compact
+        # build the map of nodes, or a view that makes them on demand
+        if compact:
+            self.map = _LazyMap(self)
+        else:
+            self.map = [[Node(navigable[y * width + x] == 1, x, y)
+                         for y in range(height)] for x in range(width)]
+        # find the boat and the treasure in the map
+        if boat is not None:
+            self.boat = self.map[boat[0]][boat[1]]
+        if treasure is not None:
+            self.treasure = self.map[treasure[0]][treasure[1]]
+        # the neighour index, built by the first search
+        self._adjacency = None
+        self._moves = None
+        # the search scratch states, created by the first find_path
+        self._search = None
+        self._reverse_search = None
+        # the cluster hierarchy, built by the first hierarchical search
+        self._hierarchy = None
+        # no path cache unless one is attached
+        self.path_cache = None
+        self._fingerprint = None
+        self._changes = []
+        # the nodes holding results of the last search
+        self._published = []
+        # the planners and indexes to tell when cells change
+        self._listeners = weakref.WeakSet()
+        # the body of water of each cell, labelled when first asked for or
+        # by the first search that finds no path
+        self._components = None
+        self._merged = []
+        self._split = False
+        # the masks belong to this grid unless attached to shared memory
+        self._shared = None
+        self._copy_on_write = False
 
     @classmethod
-    def open_grid(cls, file_path):
+    def load_binary(cls, file_path, compact=True):
         """
-        @rtype: TextIOWrapper
+        Return a new Grid read from a binary chart written by save_binary
+
+        The file is memory-mapped and its bitmap is expanded into the
+        navigability mask in a single pass, without parsing any text.
+
+        @type file_path: str
+        @type compact: bool
+           see __init__
+        @rtype: Grid
         """
-        # open the path file
-        return open(file_path)
+        with open(file_path, 'rb') as chart_file:
+            # an empty file cannot even be mapped
+            if os.fstat(chart_file.fileno()).st_size < _BINARY_HEADER.size:
+                raise ValueError(
+                    '{} is too short for a binary chart'.format(file_path))
+            with mmap.mmap(chart_file.fileno(), 0,
+                           access=mmap.ACCESS_READ) as chart:
+                (magic, version, width, height, boat_x, boat_y,
+                 treasure_x, treasure_y) = _BINARY_HEADER.unpack_from(chart)
+                if magic != _BINARY_MAGIC or version != _BINARY_VERSION:
+                    raise ValueError(
+                        '{} is not a binary chart'.format(file_path))
+                start = _BINARY_HEADER.size
+                end = start + (width * height + 7) // 8
+                if width < 1 or height < 1 or len(chart) < end:
+                    raise ValueError('{} is truncated or corrupt'.format(
+                        file_path))
+                with memoryview(chart) as view:
+                    navigable = _unpack_bits(view[start:end], width * height)
+        # a negative x stands for a missing boat or treasure
+        boat = (boat_x, boat_y) if boat_x >= 0 else None
+        treasure = (treasure_x, treasure_y) if treasure_x >= 0 else None
+        for name, cell in (('boat', boat), ('treasure', treasure)):
+            if cell is not None and not (0 <= cell[0] < width and
+                                         0 <= cell[1] < height):
+                raise ValueError('the {} of {} is off the chart'.format(
+                    name, file_path))
+        grid = cls.__new__(cls)
+        grid._setup(width, height, navigable, boat, treasure, compact)
+        return grid
 
-    def __str__(self):
+    def save_binary(self, file_path):
         """
-        Return a string representation.
+        Write this grid to <file_path> as a binary chart
+
+        The chart holds a fixed header with the width, the height and the
+        coordinates of the boat and the treasure, followed by the
+        navigability of every cell in row major order, one bit per cell.
 
         @type self: Grid
-        @rtype: str
+        @type file_path: str
+        @rtype: None
+        """
+        with open(file_path, 'wb') as chart_file:
+            chart_file.write(self._header(_BINARY_MAGIC, _BINARY_VERSION))
+            chart_file.write(_pack_bits(self._navigable))
+
+    def _header(self, magic, version):
+        """
+        Return the header of a binary or shared chart of this grid
+
+        @type self: Grid
+        @type magic: bytes
+        @type version: int
+        @rtype: bytes
+        """
+        boat = getattr(self, 'boat', None)
+        treasure = getattr(self, 'treasure', None)
+        return _BINARY_HEADER.pack(
+            magic, version, self.width, self.height,
+            boat.grid_x if boat else -1, boat.grid_y if boat else -1,
+            treasure.grid_x if treasure else -1,
+            treasure.grid_y if treasure else -1)
+
+    def to_shared_memory(self, name=None):
+        """
+        Copy this grid into a new shared memory block, from which any
+        process can make a Grid with from_shared_memory
+
+        The block holds the header of a binary chart followed by the
+        navigability mask and the adjacency masks, one byte per cell
+        each, so a grid attached to it needs neither parsing nor the
+        neighour index built again.  The caller owns the block: it must
+        close and unlink it once every process is done with it.
+
+        @type self: Grid
+        @type name: str, None
+           the name of the block, or None for a new unique name
+        @rtype: SharedMemory
 
         >>> g = Grid("", ["B.++", ".+..", "...T"])
-        >>> print(g)
+        >>> block = g.to_shared_memory()
+        >>> shared = Grid.from_shared_memory(block.name)
+        >>> print(shared)
         B.++
         .+..
         ...T
+        >>> shared.find_path(shared.boat, shared.treasure)
+        >>> shared.treasure.gcost
+        38
+        >>> shared.close()
+        >>> block.close()
+        >>> block.unlink()
         """
-        # TODO
-        # create an empty list for strings
-        strings = []
-        # get the map list which is zipped
-        _map = list(zip(*self.map))
-        # loop the row in the map
-        for row in _map:
-            # create an empty string
-            string = ''
-            # loop the node on the row
-            for node in row:
-                # if the node is not navigable
-                if not node.navigable:
-                    # add the plus symbol to the string
-                    string += '+'
-                # otherwise
-                else:
-                    # if the node is the boat
-                    if node is self.boat:
-                        # add the B to the string
-                        string += 'B'
-                    # else if the node is the treasure
-                    elif node is self.treasure:
-                        # add the T to the big string
-                        string += 'T'
-                    # otherwise
-                    else:
-                        # add the dot symbol to the big string
-                        string += '.'
-            # add the string to the list of string
-            strings.append(string)
-        return '\n'.join(strings)
+        adjacency, _ = self.neighour_index()
+        header = self._header(_SHARED_MAGIC, _SHARED_VERSION)
+        size = self.width * self.height
+        block = shared_memory.SharedMemory(name, create=True,
+                                           size=len(header) + 2 * size)
+        start = len(header)
+        block.buf[:start] = header
+        block.buf[start:start + size] = self._navigable
+        block.buf[start + size:start + 2 * size] = adjacency
+        return block
 
-    def move(self, direction):
+    @classmethod
+    def from_shared_memory(cls, name, compact=True):
         """
-        Move the boat in a specific direction, if the node
-        corresponding to the direction is navigable
-        Else do nothing
+        Return a Grid on the chart in the shared memory block <name>,
+        made by to_shared_memory
 
-        @type self: Grid
-        @type direction: str
-        @rtype: None
+        The grid reads its masks straight from the block, so any number
+        of processes can search one copy of the chart.  Changing the
+        navigability of a cell first copies the masks into the grid,
+        which leaves the block and the other grids as they were.  Call
+        close when the grid is no longer needed.
+
+        @type name: str
+        @type compact: bool
+           see __init__
+        @rtype: Grid
+        """
+        block = shared_memory.SharedMemory(name)
+        (magic, version, width, height, boat_x, boat_y,
+         treasure_x, treasure_y) = _BINARY_HEADER.unpack_from(block.buf)
+        if magic != _SHARED_MAGIC or version != _SHARED_VERSION:
+            block.close()
+            raise ValueError('{} is not a shared chart'.format(name))
+        start = _BINARY_HEADER.size
+        size = width * height
+        # slices outlive the view they are taken from
+        with block.buf.toreadonly() as view:
+            navigable = view[start:start + size]
+            adjacency = view[start + size:start + 2 * size]
+        grid = cls.__new__(cls)
+        grid._setup(width, height, navigable,
+                    (boat_x, boat_y) if boat_x >= 0 else None,
+                    (treasure_x, treasure_y) if treasure_x >= 0 else None,
+                    compact)
+        grid._adjacency = adjacency
+        grid._moves = _move_table(width)
+        # the block cannot be closed while views of it are alive, so the
+        # views are released first, when the grid goes or is closed
+        grid._shared = weakref.finalize(grid, _detach_shared, block,
+                                        (navigable, adjacency))
+        grid._copy_on_write = True
+        return grid
+
+    def close(self):
+        """
+        Detach this grid from the shared memory block it was made from;
+        a detached grid can no longer be searched
+
+        Grids that own their masks are left as they are.
+
+        @type self: Grid
+        @rtype: None
+        """
+        if self._shared is not None:
+            self._shared()
+            self._shared = None
+
+    def _own_masks(self):
+        """
+        Copy the masks and labels this grid reads along with other grids
+        into the grid, so they can change, detaching it from any shared
+        memory
+
+        @type self: Grid
+        @rtype: None
+        """
+        navigable = bytearray(self._navigable)
+        adjacency = (None if self._adjacency is None
+                     else bytearray(self._adjacency))
+        self.close()
+        self._navigable = navigable
+        self._adjacency = adjacency
+        # the labels are kept up to date in place too
+        if self._components is not None:
+            self._components = array('i', self._components)
+            self._merged = list(self._merged)
+        self._copy_on_write = False
+
+    def fork(self):
+        """
+        Return a new compact Grid that reads the chart of this grid in
+        place, with the boat and the treasure where they are now
+
+        The fork has its own boat, nodes and search results, but shares
+        the navigability mask, the neighour index, the bodies of water
+        and the path cache of this grid, so it takes the same small time
+        and memory however large the chart is.  Whichever grid changes
+        the navigability of a cell first copies the masks, which leaves
+        the other grids as they were.
+
+        The first fork of a grid works out its neighour index, so every
+        fork shares it.  The bodies of water are shared too once this grid
+        has worked them out, but forking does not work them out.
+
+        @type self: Grid
+        @rtype: Grid
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> f = g.fork()
+        >>> f._navigable is g._navigable
+        True
+        >>> f.move('S')
+        >>> f.set_navigable(1, 0, False)
+        >>> print(f)
+        .+++
+        B+..
+        ...T
+        >>> print(g)
+        B.++
+        .+..
+        ...T
+        """
+        adjacency, moves = self.neighour_index()
+        boat = getattr(self, 'boat', None)
+        treasure = getattr(self, 'treasure', None)
+        grid = self.__class__.__new__(self.__class__)
+        grid._setup(self.width, self.height, self._navigable,
+                    (boat.grid_x, boat.grid_y) if boat else None,
+                    (treasure.grid_x, treasure.grid_y) if treasure else None,
+                    True)
+        grid._adjacency = adjacency
+        grid._moves = moves
+        grid._components = self._components
+        grid._merged = self._merged
+        grid._split = self._split
+        grid._fingerprint = self._fingerprint
+        grid._changes = list(self._changes)
+        grid.path_cache = self.path_cache
+        # the masks now have more than one reader
+        self._copy_on_write = grid._copy_on_write = True
+        return grid
+
+    @classmethod
+    def open_grid(cls, file_path):
+        """
+        @rtype: TextIOWrapper
+        """
+        # open the path file
+        return open(file_path)
+
+    def __str__(self):
+        """
+        Return a string representation.
+
+        @type self: Grid
+        @rtype: str
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> print(g)
+        B.++
+        .+..
+        ...T
+        """
+        # TODO
+        # render straight from the navigability mask
+        return self.render(())
+
+    def render(self, path_nodes):
+        """
+        Return the string representation of this grid with the nodes of
+        path_nodes drawn as "*"
+
+        The boat and the treasure are drawn over the path.  No Node
+        objects are needed for the rest of the map.
+
+        @type self: Grid
+        @type path_nodes: Iterable[Node]
+        @rtype: str
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> print(g.render([g.map[1][0], g.map[2][1], g.treasure]))
+        B*++
+        .+*.
+        ...T
+        """
+        width = self.width
+        navigable = self._navigable
+        # the indices of the path cells; islands are never marked
+        path = [index for index in (node.grid_y * width + node.grid_x
+                                    for node in path_nodes)
+                if navigable[index]]
+        # the boat wins over the treasure, which wins over the path
+        marks = [(node.grid_y * width + node.grid_x, ord(symbol))
+                 for node, symbol in ((self.treasure, 'T'), (self.boat, 'B'))
+                 if node.navigable]
+        if numpy is not None:
+            return _render_numpy(navigable, width, self.height, path, marks)
+        # turn the mask into a row major buffer of '+' and '.'
+        cells = bytearray(bytes(navigable).translate(_SYMBOL_TABLE))
+        # scatter the path and the marks into the buffer
+        for index in path:
+            cells[index] = ord('*')
+        for index, symbol in marks:
+            cells[index] = symbol
+        # cut the buffer into lines
+        return b'\n'.join(cells[start:start + width] for start in
+                          range(0, len(cells), width)).decode('ascii')
+
+    def move(self, direction):
+        """
+        Move the boat in a specific direction, if the node
+        corresponding to the direction is navigable
+        Else do nothing
+
+        @type self: Grid
+        @type direction: str
+        @rtype: None
 
         direction may be one of the following:
         N, S, E, W, NW, NE, SW, SE
@@ -555,27 +1638,59 @@ class Grid:
         x = node.grid_x
         # difine y as the node on the grid-y
         y = node.grid_y
-        # create an empty list as neighours
-        neighours = []
-        # loop the tuple of y and x in these tuple
-        for delta_y, delta_x in ((1, 0), (-1, 0), (0, 1), (0, -1),
-                                 (1, 1), (1, -1), (-1, 1), (-1, -1)):
-            # get the new-x
-            new_x = x + delta_x
-            # get the new-y
-            new_y = y + delta_y
-            # if the new y is greater than -1 and less than height
-            # and the new x is greater than -1 and less than the wide
-            if -1 < new_y < self.height and -1 < new_x < self.width:
-                # define the map of new x and new y as current node
-                curr_node = self.map[new_x][new_y]
-                # if the current node is navigable
-                if curr_node.navigable:
-                    # add the current node to the list of neighours
-                    neighours.append(curr_node)
-        return neighours
-
-    def find_path(self, start_node, target_node):
+        # look the moves to navigable neighours up in the index
+        adjacency, moves = self.neighour_index()
+        return [self.map[x + delta_x][y + delta_y] for _, _, delta_x, delta_y
+                in moves[adjacency[y * self.width + x]]]
+
+    def navigability(self):
+        """
+        Return the navigability mask of this grid, one byte per cell in
+        row major order, 1 for navigable
+
+        The mask may be read by other grids or processes too, so it is
+        only to be read; cells are changed with update_navigable, which
+        may replace the mask.
+
+        @type self: Grid
+        @rtype: bytearray, memoryview
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> list(g.navigability()[:4])
+        [1, 1, 0, 0]
+        """
+        return self._navigable
+
+    def neighour_index(self):
+        """
+        Return the adjacency masks and move table of this grid, building
+        them on first use
+
+        Bit k of the mask of a cell is set iff move k of NEIGHBOUR_DELTAS
+        leads from it to a navigable neighour, and the move table lists
+        the moves of each mask.  Like the navigability mask, the masks
+        are only to be read.
+
+        @type self: Grid
+        @rtype: (bytearray, tuple[tuple[(int, int, int, int)]])
+           the mask of each cell in row major order, and the table
+           indexed by mask of the (index offset, cost, delta x, delta y)
+           of its moves
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> adjacency, moves = g.neighour_index()
+        >>> [(delta_x, delta_y) for _, _, delta_x, delta_y
+        ...  in moves[adjacency[0]]]
+        [(0, 1), (1, 0)]
+        """
+        if self._adjacency is None:
+            width = self.width
+            self._adjacency = _build_adjacency(
+                self._navigable, width, self.height)
+            self._moves = _move_table(width)
+        return self._adjacency, self._moves
+
+    def find_path(self, start_node, target_node, algorithm='astar'):
         """
         Implement the A-star path search algorithm
         If you will add a new node to the path, don't forget to set the parent.
@@ -588,6 +1703,13 @@ class Grid:
            The starting node of the path
         @type target_node: Node
            The target node of the path
+        @type algorithm: str
+           'astar' for plain A-star, 'jps' for Jump Point Search,
+           which finds a path of the same cost while expanding far fewer
+           nodes on open water, 'bidirectional' for A-star run from
+           both ends until the two searches meet, or 'hpa' for a search
+           on the cluster hierarchy of this grid, which is much faster on
+           large charts but may find a slightly longer path
         @rtype: None
 
         >>> g = Grid("", ["B.++", ".+..", "...T"])
@@ -612,53 +1734,1087 @@ class Grid:
         True
         """
         # TODO
-        def less_than(x_node, y_node):
+        # pick the search algorithm
+        if algorithm not in _SEARCH_METHODS:
+            raise ValueError(
+                'unknown path search algorithm {!r}'.format(algorithm))
+        width = self.width
+        start = start_node.grid_y * width + start_node.grid_x
+        # start a fresh search on the scratch state of this grid
+        target = target_node.grid_y * width + target_node.grid_x
+        search = self._new_search()
+        cache = self.path_cache
+        if self._cut_off(start_node, target_node):
+            # no search can find a path between two bodies of water
+            pass
+        elif cache is None:
+            getattr(self, _SEARCH_METHODS[algorithm])(
+                search, start_node, target_node)
+        else:
+            key = (self.fingerprint(), algorithm, start, target)
+            cells = cache.get(key, self._earlier_keys(key))
+            if cells is None:
+                getattr(self, _SEARCH_METHODS[algorithm])(
+                    search, start_node, target_node)
+                cache.put(key, self._path_cells(search, target))
+            else:
+                # a cached path only publishes the nodes along it
+                self._lay_path(search, cells, target_node)
+        if search.stamp[target] != search.generation:
+            self._labels()
+        # copy the result onto the nodes for retrace_path and plot_path
+        self._publish(search, start)
+
+    def find_paths(self, start_node, target_nodes):
+        """
+        Find shortest paths from start_node to every node in target_nodes
+        with one search
+
+        Dijkstra's algorithm runs from start_node until every reachable
+        target has been expanded, so a chart with many candidate sites is
+        searched once rather than once per site.  Costs are in the units
+        of Node.distance, and each path is in the format of retrace_path.
+        The nodes of the search are published as by find_path, so
+        plot_path can draw any of the paths afterwards.
+
+        @type self: Grid
+        @type start_node: Node
+        @type target_nodes: list[Node]
+        @rtype: list[(list[Node], int)]
+           the path to each target and its cost, in the order of
+           target_nodes, or ([], None) for a target that cannot be reached
+           from start_node
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> results = g.find_paths(g.boat, [g.treasure, g.map[0][2]])
+        >>> [([(n.grid_x, n.grid_y) for n in path], cost)
+        ...  for path, cost in results]
+        [([(0, 0), (1, 0), (2, 1), (3, 2)], 38), ([(0, 0), (0, 1), (0, 2)], 20)]
+        >>> g.find_paths(g.boat, [g.map[2][0]])
+        [([], None)]
+        """
+        width = self.width
+        start = start_node.grid_y * width + start_node.grid_x
+        search = self._new_search()
+        # targets in other bodies of water are left out of the search
+        goals = set(target.grid_y * width + target.grid_x
+                    for target in target_nodes
+                    if not self._cut_off(start_node, target))
+        if goals:
+            self._dijkstra(search, start, goals)
+        self._publish(search, start)
+        results = []
+        for target in target_nodes:
+            # only a target the search expanded has a path and a final
+            # cost; the labels may pass targets new land has cut off
+            if search.status_of(
+                    target.grid_y * width + target.grid_x) != _EXPANDED:
+                self._labels()
+                results.append(([], None))
+            else:
+                # as with find_path, the start itself gets [] at cost 0
+                results.append((self.retrace_path(start_node, target),
+                                target.gcost))
+        return results
+
+    def find_nearest(self, start_nodes, target_node):
+        """
+        Find which node in start_nodes has the shortest path to
+        target_node, and that path, with one search
+
+        A-star runs from every start at once, each at cost 0, so the
+        search costs about as much as one find_path from the closest
+        start however many starts there are.  The nodes of the search are
+        published as by find_path, with the parent chain of target_node
+        leading back to the winning start.
+
+        @type self: Grid
+        @type start_nodes: list[Node]
+        @type target_node: Node
+        @rtype: (Node, list[Node])
+           the closest start and its path in the format of retrace_path,
+           or (None, []) if no start can reach target_node
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> winner, path = g.find_nearest([g.boat, g.map[0][2]], g.treasure)
+        >>> (winner.grid_x, winner.grid_y), g.treasure.gcost
+        ((0, 2), 30)
+        >>> [(n.grid_x, n.grid_y) for n in path]
+        [(0, 2), (1, 2), (2, 2), (3, 2)]
+        """
+        width = self.width
+        search = self._new_search()
+        # starts in other bodies of water are left out of the search
+        starts = [start_node for start_node in start_nodes
+                  if not self._cut_off(start_node, target_node)]
+        if not starts:
+            self._publish(search, -1)
+            return None, []
+        self._astar_from(search, starts, target_node)
+        winner = target_node.grid_y * width + target_node.grid_x
+        # the labels may pass starts new land has cut off, and the parent
+        # slots of cells this search did not reach are stale
+        if search.status_of(winner) != _EXPANDED:
+            self._labels()
+            self._publish(search, -1)
+            return None, []
+        # follow the parent chain back to the start it grew from
+        while search.parent[winner] >= 0:
+            winner = search.parent[winner]
+        self._publish(search, winner)
+        winner_node = self.map[winner % width][winner // width]
+        return winner_node, self.retrace_path(winner_node, target_node)
+
+    def _dijkstra(self, search, start, goals):
+        """
+        Run Dijkstra's algorithm from cell <start> on <search> until every
+        cell in <goals> has been expanded or the frontier runs out
+
+        @type self: Grid
+        @type search: SearchState
+           a freshly reset search state
+        @type start: int
+           the index of the start cell
+        @type goals: set[int]
+           the indices of the cells to reach
+        @rtype: None
+        """
+        gcost, parent = search.gcost, search.parent
+        status, stamp = search.status, search.stamp
+        generation = search.generation
+        adjacency, moves = self.neighour_index()
+        remaining = set(goals)
+        # with no heuristic the frontier is ordered on cost alone
+        frontier = IndexedPriorityQueue(
+            lambda x_index, y_index: gcost[x_index] < gcost[y_index])
+        search.reach(start, 0, 0, -1)
+        frontier.add(start)
+        while not frontier.is_empty():
+            curr = frontier.remove()
+            status[curr] = _EXPANDED
+            search.expanded += 1
+            remaining.discard(curr)
+            # every goal is closed, so its cost is final
+            if not remaining:
+                break
+            for delta, step, _, _ in moves[adjacency[curr]]:
+                index = curr + delta
+                cost = gcost[curr] + step
+                if stamp[index] != generation:
+                    search.reach(index, cost, 0, curr)
+                    frontier.add(index)
+                elif status[index] == _ON_FRONTIER and cost < gcost[index]:
+                    search.record(index, cost, 0, curr)
+                    frontier.update(index)
+
+    def _astar(self, search, start_node, target_node):
+        """
+        Run A-star from start_node to target_node on <search>
+
+        @type self: Grid
+        @type search: SearchState
+           a freshly reset search state
+        @type start_node: Node
+        @type target_node: Node
+        @rtype: None
+        """
+        self._astar_from(search, [start_node], target_node)
+
+    def _astar_from(self, search, start_nodes, target_node):
+        """
+        Run A-star to target_node on <search> from every node in
+        start_nodes at once
+
+        Every start is put on the frontier at cost 0, so the search ends
+        on a shortest path from whichever start is closest, and its parent
+        chain leads back to that start.
+
+        @type self: Grid
+        @type search: SearchState
+           a freshly reset search state
+        @type start_nodes: list[Node]
+        @type target_node: Node
+        @rtype: None
+        """
+        # bind the state arrays locally for the main loop
+        gcost, fcost, parent = search.gcost, search.fcost, search.parent
+        status, stamp = search.status, search.stamp
+        generation = search.generation
+        adjacency, moves = self.neighour_index()
+        width = self.width
+        target_x = target_node.grid_x
+        target_y = target_node.grid_y
+
+        def less_than(x_index, y_index):
             """
             Compare the priority of x over y
-            @type x_node: Node
-            @type y_node: Node
+            @type x_index: int
+            @type y_index: int
             @rtype: bool
                 True if x has higher priority over y otherwise False
             """
-            return x_node < y_node
-        # create an empty list as open set
-        open_set = []
-        # loop the row on the map
-        for row in self.map:
-            # extend the row in the list
-            open_set.extend(row)
-        # remove the start node from the list
-        open_set.remove(start_node)
-        # define a closed set as the priority queue in less_than
-        closed_set = PriorityQueue(less_than)
-        # add the start node to the list of closed set
-        closed_set.add(start_node)
-        # set the gcost for start node
-        start_node.set_gcost(0)
-        # loop the closed set if it is not empty
-        while not closed_set.is_empty():
-            # get the current node from the closed set
-            curr_node = closed_set.remove()
-            # if the current node is the target node
-            if curr_node is target_node:
+            return fcost[x_index] < fcost[y_index]
+        # get the index of the target node
+        target = target_node.grid_y * width + target_node.grid_x
+        # the frontier holds reached cells whose cost may still drop
+        frontier = IndexedPriorityQueue(less_than)
+        # add the start nodes to the frontier
+        for start_node in start_nodes:
+            start = start_node.grid_y * width + start_node.grid_x
+            if stamp[start] != generation:
+                search.reach(start, 0, start_node.distance(target_node), -1)
+                frontier.add(start)
+        # loop the frontier if it is not empty
+        while not frontier.is_empty():
+            # get the current cell from the frontier, it is now closed
+            curr = frontier.remove()
+            status[curr] = _EXPANDED
+            search.expanded += 1
+            # if the current cell is the target
+            if curr == target:
                 # done
                 break
-            # loop the next node in the neighours for current node
-            for next_node in self.get_neighours(curr_node):
-                # if the next node is in the open set
-                if next_node in open_set:
-                    # remove the next node
-                    open_set.remove(next_node)
-                    # add it to the closed set
-                    closed_set.add(next_node)
-                    # set the gcost for the next node
-                    next_node.set_gcost(
-                        curr_node.gcost + curr_node.distance(next_node))
-                    # set the hcost for the next_node
-                    next_node.set_hcost(
-                        next_node.distance(target_node))
-                    # set the parent for the next node
-                    next_node.set_parent(curr_node)
+            curr_x = curr % width
+            curr_y = curr // width
+            # loop the moves to the navigable neighours of the current cell
+            for delta, step, delta_x, delta_y in moves[adjacency[curr]]:
+                # get the index of the next cell in the state arrays
+                index = curr + delta
+                next_x = curr_x + delta_x
+                next_y = curr_y + delta_y
+                # the cost of reaching the next cell through this one
+                cost = gcost[curr] + step
+                # if the next cell has not been reached in this search
+                if stamp[index] != generation:
+                    search.reach(index, cost, octile(
+                        next_x - target_x, next_y - target_y), curr)
+                    # add it to the frontier once its priority is known
+                    frontier.add(index)
+                # else if this is a cheaper way to a cell on the frontier
+                elif status[index] == _ON_FRONTIER and cost < gcost[index]:
+                    # relax the cell and move it up in the frontier
+                    fcost[index] -= gcost[index] - cost
+                    gcost[index] = cost
+                    parent[index] = curr
+                    frontier.update(index)
+                # otherwise the cell is expanded and cannot improve
+
+    def _bidirectional_astar(self, search, start_node, target_node):
+        """
+        Run A-star from both start_node and target_node on <search>
+
+        The two searches take turns expanding a node.  Whenever a cell
+        reached by one search is reached or improved by the other, the
+        path through it is a candidate.  The search stops as soon as the
+        node taken off either frontier has an fcost no smaller than the
+        best candidate: with consistent heuristics, no path through that
+        frontier can be cheaper.  The path through the meeting cell is
+        then written into <search> as one parent chain from start_node.
+
+        @type self: Grid
+        @type search: SearchState
+           a freshly reset search state, used for the forward search
+        @type start_node: Node
+        @type target_node: Node
+        @rtype: None
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> g.find_path(g.boat, g.treasure, 'bidirectional')
+        >>> [(n.grid_x, n.grid_y, n.gcost)
+        ...  for n in g.retrace_path(g.boat, g.treasure)]
+        [(0, 0, 0), (1, 0, 10), (2, 1, 24), (3, 2, 38)]
+        """
+        # the backward search has its own scratch state
+        if self._reverse_search is None:
+            self._reverse_search = SearchState(self.width * self.height)
+        else:
+            self._reverse_search.reset()
+        reverse = self._reverse_search
+        adjacency, moves = self.neighour_index()
+        width = self.width
+        start = start_node.grid_y * width + start_node.grid_x
+        target = target_node.grid_y * width + target_node.grid_x
+
+        def frontier_of(state):
+            """
+            Return an empty frontier ordered by the fcost of <state>
+            @type state: SearchState
+            @rtype: IndexedPriorityQueue
+            """
+            fcost = state.fcost
+            return IndexedPriorityQueue(lambda a, b: fcost[a] < fcost[b])
+        # each side: its state, frontier, goal and the other side's state
+        sides = ((search, frontier_of(search), target_node, reverse),
+                 (reverse, frontier_of(reverse), start_node, search))
+        distance = start_node.distance(target_node)
+        search.reach(start, 0, distance, -1)
+        sides[0][1].add(start)
+        reverse.reach(target, 0, distance, -1)
+        sides[1][1].add(target)
+        # the cost of the best path found so far, and where its halves meet
+        best = 0 if start == target else NO_COST
+        meet = start if start == target else -1
+        turn = 0
+        while not (sides[0][1].is_empty() or sides[1][1].is_empty()):
+            state, frontier, goal, other = sides[turn]
+            turn = 1 - turn
+            curr = frontier.remove()
+            # nothing left on this side can beat the best path
+            if state.fcost[curr] >= best:
+                break
+            state.status[curr] = _EXPANDED
+            state.expanded += 1
+            gcost = state.gcost
+            curr_x = curr % width
+            curr_y = curr // width
+            for delta, step, delta_x, delta_y in moves[adjacency[curr]]:
+                index = curr + delta
+                cost = gcost[curr] + step
+                if state.stamp[index] != state.generation:
+                    state.reach(index, cost, octile(
+                        curr_x + delta_x - goal.grid_x,
+                        curr_y + delta_y - goal.grid_y), curr)
+                    frontier.add(index)
+                elif (state.status[index] == _ON_FRONTIER and
+                      cost < gcost[index]):
+                    state.fcost[index] -= gcost[index] - cost
+                    gcost[index] = cost
+                    state.parent[index] = curr
+                    frontier.update(index)
+                else:
+                    continue
+                # the other side has been here: the halves make a path
+                if (other.stamp[index] == other.generation and
+                        cost + other.gcost[index] < best):
+                    best = cost + other.gcost[index]
+                    meet = index
+        search.expanded += reverse.expanded
+        if meet < 0:
+            return
+        # continue the forward chain along the backward one to the target
+        index = meet
+        while reverse.parent[index] >= 0:
+            next_index = reverse.parent[index]
+            search.record(
+                next_index, best - reverse.gcost[next_index],
+                reverse.gcost[next_index], index)
+            index = next_index
+
+    def _jump_point_search(self, search, start_node, target_node):
+        """
+        Run Jump Point Search from start_node to target_node on <search>
+
+        Every move costs the same and the map is 8-connected, so runs of
+        open water are crossed in single jumps and only jump points, the
+        cells where an island forces a turn, go on the frontier.  The
+        path found costs the same as with A-star.  Afterwards the cells
+        between consecutive jump points of the path are filled in, so
+        that the parent chain is the same as A-star would leave it.
+
+        @type self: Grid
+        @type search: SearchState
+           a freshly reset search state
+        @type start_node: Node
+        @type target_node: Node
+        @rtype: None
+
+        >>> g = Grid("", ["B.......", "........", "......+.", ".......T"])
+        >>> g.find_path(g.boat, g.treasure, 'jps')
+        >>> [(n.grid_x, n.grid_y) for n in g.retrace_path(g.boat, g.treasure)]
+        [(0, 0), (1, 1), (2, 2), (3, 3), (4, 3), (5, 3), (6, 3), (7, 3)]
+        >>> g.treasure.gcost
+        82
+        """
+        gcost, fcost, parent = search.gcost, search.fcost, search.parent
+        status, stamp = search.status, search.stamp
+        generation = search.generation
+        navigable = self._navigable
+        width = self.width
+        height = self.height
+        target_x = target_node.grid_x
+        target_y = target_node.grid_y
+
+        def is_open(x, y):
+            """
+            Return True iff (x, y) is on the map and navigable
+            @type x: int
+            @type y: int
+            @rtype: bool
+            """
+            return (-1 < x < width and -1 < y < height and
+                    navigable[y * width + x] == 1)
+
+        def jump(x, y, delta_x, delta_y):
+            """
+            Return the index of the first jump point reached by moving
+            from (x, y) in direction (delta_x, delta_y), or -1 if the
+            move runs into an island or off the map first
+            @type x: int
+            @type y: int
+            @type delta_x: int
+            @type delta_y: int
+            @rtype: int
+            """
+            while True:
+                x += delta_x
+                y += delta_y
+                if not is_open(x, y):
+                    return -1
+                if x == target_x and y == target_y:
+                    return y * width + x
+                if delta_x and delta_y:
+                    # a diagonal move stops at a forced neighour, or where
+                    # a straight move along either axis finds a jump point
+                    if ((is_open(x - delta_x, y + delta_y) and
+                         not is_open(x - delta_x, y)) or
+                            (is_open(x + delta_x, y - delta_y) and
+                             not is_open(x, y - delta_y)) or
+                            jump(x, y, delta_x, 0) >= 0 or
+                            jump(x, y, 0, delta_y) >= 0):
+                        return y * width + x
+                elif delta_x:
+                    # a horizontal move stops beside the end of an island
+                    if ((is_open(x + delta_x, y + 1) and
+                         not is_open(x, y + 1)) or
+                            (is_open(x + delta_x, y - 1) and
+                             not is_open(x, y - 1))):
+                        return y * width + x
+                # a vertical move stops beside the end of an island
+                elif ((is_open(x + 1, y + delta_y) and not is_open(x + 1, y))
+                      or (is_open(x - 1, y + delta_y) and
+                          not is_open(x - 1, y))):
+                    return y * width + x
+
+        def directions(curr, x, y):
+            """
+            Return the directions worth jumping in from cell curr at
+            (x, y), given the direction it was reached in
+            @type curr: int
+            @type x: int
+            @type y: int
+            @rtype: list[(int, int)]
+            """
+            if parent[curr] < 0:
+                return [(delta_x, delta_y)
+                        for delta_x, delta_y, _ in NEIGHBOUR_DELTAS]
+            from_x = parent[curr] % width
+            from_y = parent[curr] // width
+            delta_x = (x > from_x) - (x < from_x)
+            delta_y = (y > from_y) - (y < from_y)
+            # keep going, and turn around islands next to the path
+            if delta_x and delta_y:
+                result = [(0, delta_y), (delta_x, 0), (delta_x, delta_y)]
+                if not is_open(x - delta_x, y):
+                    result.append((-delta_x, delta_y))
+                if not is_open(x, y - delta_y):
+                    result.append((delta_x, -delta_y))
+            elif delta_x:
+                result = [(delta_x, 0)]
+                for side in (1, -1):
+                    if not is_open(x, y + side):
+                        result.append((delta_x, side))
+            else:
+                result = [(0, delta_y)]
+                for side in (1, -1):
+                    if not is_open(x + side, y):
+                        result.append((side, delta_y))
+            return result
+
+        def less_than(x_index, y_index):
+            """
+            Compare the priority of x over y
+            @type x_index: int
+            @type y_index: int
+            @rtype: bool
+            """
+            return fcost[x_index] < fcost[y_index]
+        start = start_node.grid_y * width + start_node.grid_x
+        target = target_y * width + target_x
+        frontier = IndexedPriorityQueue(less_than)
+        search.reach(start, 0, start_node.distance(target_node), -1)
+        frontier.add(start)
+        while not frontier.is_empty():
+            curr = frontier.remove()
+            status[curr] = _EXPANDED
+            search.expanded += 1
+            if curr == target:
+                self._fill_jumps(search, target, target_node)
+                break
+            curr_x = curr % width
+            curr_y = curr // width
+            # loop the jump points reachable from the current one
+            for delta_x, delta_y in directions(curr, curr_x, curr_y):
+                index = jump(curr_x, curr_y, delta_x, delta_y)
+                if index < 0:
+                    continue
+                next_x = index % width
+                next_y = index // width
+                cost = gcost[curr] + octile(next_x - curr_x, next_y - curr_y)
+                if stamp[index] != generation:
+                    search.reach(index, cost, octile(
+                        next_x - target_x, next_y - target_y), curr)
+                    frontier.add(index)
+                elif status[index] == _ON_FRONTIER and cost < gcost[index]:
+                    fcost[index] -= gcost[index] - cost
+                    gcost[index] = cost
+                    parent[index] = curr
+                    frontier.update(index)
+
+    def _fill_jumps(self, search, target, target_node):
+        """
+        Give every cell between consecutive jump points on the path to
+        <target> its gcost and parent in <search>
+
+        @type self: Grid
+        @type search: SearchState
+        @type target: int
+           the index of the target cell, reached by the search
+        @type target_node: Node
+        @rtype: None
+        """
+        gcost, parent = search.gcost, search.parent
+        width = self.width
+        index = target
+        # walk the jump points back from the target
+        while parent[index] >= 0:
+            jump_from = parent[index]
+            x = jump_from % width
+            y = jump_from // width
+            step_x = (index % width > x) - (index % width < x)
+            step_y = (index // width > y) - (index // width < y)
+            step_cost = 14 if step_x and step_y else 10
+            # step from the previous jump point towards this one
+            prev = jump_from
+            cost = gcost[jump_from]
+            cell = jump_from + step_y * width + step_x
+            while cell != index:
+                x += step_x
+                y += step_y
+                cost += step_cost
+                search.record(cell, cost, octile(
+                    x - target_node.grid_x, y - target_node.grid_y), prev)
+                prev = cell
+                cell += step_y * width + step_x
+            parent[index] = prev
+            index = jump_from
+
+    def hierarchy(self, cluster_size=None):
+        """
+        Return the cluster hierarchy of this grid, building it on first
+        use or when asked for a different cluster size
+
+        The hierarchy is built once per chart and reused by every
+        find_path(..., 'hpa') after it.
+
+        @type self: Grid
+        @type cluster_size: int, None
+           the side of a cluster, in cells, or None for hpa.CLUSTER_SIZE
+        @rtype: Hierarchy
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> g.hierarchy(2) is g.hierarchy(2)
+        True
+        """
+        # hpa imports the distance metric from this module
+        from hpa import CLUSTER_SIZE, Hierarchy
+        if cluster_size is None:
+            cluster_size = CLUSTER_SIZE
+        if (self._hierarchy is None or
+                self._hierarchy.cluster_size != cluster_size):
+            self._hierarchy = Hierarchy(self, cluster_size)
+        return self._hierarchy
+
+    def _hierarchical(self, search, start_node, target_node):
+        """
+        Find a path from start_node to target_node on the cluster
+        hierarchy and write it into <search>
+
+        @type self: Grid
+        @type search: SearchState
+           a freshly reset search state
+        @type start_node: Node
+        @type target_node: Node
+        @rtype: None
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> _ = g.hierarchy(2)
+        >>> g.find_path(g.boat, g.treasure, 'hpa')
+        >>> [(n.grid_x, n.grid_y, n.gcost)
+        ...  for n in g.retrace_path(g.boat, g.treasure)]
+        [(0, 0, 0), (1, 0, 10), (2, 1, 24), (2, 2, 34), (3, 2, 44)]
+        """
+        if self._hierarchy is None:
+            self.hierarchy()
+        width = self.width
+        cells = self._hierarchy.find_path(
+            start_node.grid_y * width + start_node.grid_x,
+            target_node.grid_y * width + target_node.grid_x)
+        self._lay_path(search, cells, target_node)
+
+    def _lay_path(self, search, cells, target_node):
+        """
+        Write the path through <cells> into <search> as a parent chain
+
+        @type self: Grid
+        @type search: SearchState
+        @type cells: Sequence[int]
+           the indices of consecutive cells, from the start of the path
+        @type target_node: Node
+        @rtype: None
+        """
+        width = self.width
+        cost = 0
+        prev = -1
+        for cell in cells:
+            x = cell % width
+            y = cell // width
+            if prev >= 0:
+                cost += octile(x - prev % width, y - prev // width)
+            search.record(cell, cost, octile(
+                x - target_node.grid_x, y - target_node.grid_y), prev)
+            prev = cell
+
+    @staticmethod
+    def _path_cells(search, target):
+        """
+        Return the indices of the cells on the path <search> found to
+        <target>, from its start, or () if it did not reach target
+
+        @type search: SearchState
+        @type target: int
+        @rtype: tuple[int]
+        """
+        if search.stamp[target] != search.generation:
+            return ()
+        cells = [target]
+        while search.parent[cells[-1]] >= 0:
+            cells.append(search.parent[cells[-1]])
+        cells.reverse()
+        return tuple(cells)
+
+    def fingerprint(self):
+        """
+        Return a digest of the size and navigability of this chart
+
+        Grids loaded from the same chart have the same fingerprint, and
+        so do grids whose charts were changed in the same cells since.
+
+        @type self: Grid
+        @rtype: bytes
+
+        >>> a = Grid("", ["B.++", ".+..", "...T"])
+        >>> b = Grid("", ["..++", ".+.B", "T..."])
+        >>> c = Grid("", ["B.+.", ".+..", "...T"])
+        >>> a.fingerprint() == b.fingerprint() != c.fingerprint()
+        True
+        """
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(struct.pack('<II', self.width, self.height))
+            digest.update(self._navigable)
+            self._fingerprint = digest.digest()
+        return self._fingerprint
+
+    def component(self, node):
+        """
+        Return the label of the body of water <node> lies in, or 0 if it
+        is land
+
+        Two navigable nodes are connected iff their labels are equal.
+        The labels are worked out for the whole chart on first use, and
+        again only if cells have become land since.
+
+        @type self: Grid
+        @type node: Node
+        @rtype: int
+
+        >>> g = Grid("", ["B.+.", "..+.", "+++T"])
+        >>> [g.component(g.map[x][0]) for x in range(4)]
+        [1, 1, 0, 2]
+        """
+        if self._split:
+            # new land may have cut a body in two
+            self._components = None
+        return self._label(node)
+
+    def _labels(self):
+        """
+        Return the body of water labels of the cells, labelling the chart
+        if it has not been
+
+        @type self: Grid
+        @rtype: array[int]
+        """
+        if self._components is None:
+            self._components = _label_components(
+                self._navigable, self.width, self.height)
+            self._merged = list(range(max(self._components, default=0) + 1))
+            self._split = False
+        return self._components
+
+    def _label(self, node):
+        """
+        Return the label of the body of water <node> lies in, or 0 if it
+        is land, as kept up to date since the chart was labelled
+
+        Cells with different labels are never connected, but after cells
+        have become land cells with the same label may not be either.
+
+        @type self: Grid
+        @type node: Node
+        @rtype: int
+        """
+        return self._root(
+            self._labels()[node.grid_y * self.width + node.grid_x])
+
+    def _root(self, label):
+        """
+        Return the label the body labelled <label> has been joined to
+
+        @type self: Grid
+        @type label: int
+        @rtype: int
+        """
+        merged = self._merged
+        # follow the joins, halving the path on the way
+        while merged[label] != label:
+            merged[label] = merged[merged[label]]
+            label = merged[label]
+        return label
+
+    def _update_components(self, changed):
+        """
+        Bring the labels up to date after the cells at indices <changed>
+        changed navigability
+
+        New water joins the bodies around it.  New land is labelled 0 and
+        marks the labels as possibly split, which is only worked out
+        again when a label itself is asked for.
+
+        @type self: Grid
+        @type changed: list[int]
+        @rtype: None
+        """
+        labels = self._components
+        if labels is None:
+            return
+        width = self.width
+        height = self.height
+        navigable = self._navigable
+        merged = self._merged
+        for index in changed:
+            if not navigable[index]:
+                labels[index] = 0
+                self._split = True
+                continue
+            grid_x = index % width
+            grid_y = index // width
+            roots = set()
+            for delta_x, delta_y, _ in NEIGHBOUR_DELTAS:
+                next_x = grid_x + delta_x
+                next_y = grid_y + delta_y
+                if 0 <= next_x < width and 0 <= next_y < height:
+                    label = labels[next_y * width + next_x]
+                    if label:
+                        roots.add(self._root(label))
+            if roots:
+                # join every body around the cell to the first one
+                label = min(roots)
+                for root in roots:
+                    merged[root] = label
+            else:
+                # a lake of its own
+                label = len(merged)
+                merged.append(label)
+            labels[index] = label
+
+    def _cut_off(self, start_node, target_node):
+        """
+        Return True if the bodies of water already worked out show there
+        is no path from start_node to target_node
+
+        The searches do not label the chart before they run, as labelling
+        costs more than most single searches.  Instead the first search
+        that finds no path labels it, so from then on a query between
+        two bodies of water returns at once.
+
+        @type self: Grid
+        @type start_node: Node
+        @type target_node: Node
+        @rtype: bool
+        """
+        return (self._components is not None and
+                not self.reachable(start_node, target_node))
+
+    def reachable(self, start_node, target_node):
+        """
+        Return True iff there is a path from start_node to target_node
+
+        The answer comes from the body of water labels, which are kept up
+        to date as cells change.  After cells have become land, True may
+        also be returned for two cells the new land has cut apart; the
+        search then finds there is no path.
+
+        @type self: Grid
+        @type start_node: Node
+        @type target_node: Node
+        @rtype: bool
+
+        >>> g = Grid("", ["B.+.", "..+.", "+++T"])
+        >>> g.reachable(g.boat, g.treasure)
+        False
+        >>> g.reachable(g.treasure, g.map[3][0])
+        True
+        """
+        if start_node is target_node:
+            return True
+        label = self._label(target_node)
+        # moves only end on water
+        if not label:
+            return False
+        if start_node.navigable:
+            return self._label(start_node) == label
+        # a start on land is connected through its neighours
+        return any(self._label(node) == label
+                   for node in self.get_neighours(start_node))
+
+    def subscribe(self, listener):
+        """
+        Have listener.update_cells(cells) called with the coordinates of
+        the cells that change navigability, for as long as listener is
+        alive
+
+        @type self: Grid
+        @type listener: object
+        @rtype: None
+        """
+        self._listeners.add(listener)
+
+    def set_navigable(self, grid_x, grid_y, navigable):
+        """
+        Make the cell at (grid_x, grid_y) navigable or not
+
+        @type self: Grid
+        @type grid_x: int
+        @type grid_y: int
+        @type navigable: bool
+        @rtype: None
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> g.set_navigable(1, 1, True)
+        >>> g.set_navigable(0, 2, False)
+        >>> print(g)
+        B.++
+        ....
+        +..T
+        >>> g.map[1][1].navigable
+        True
+        """
+        self.update_navigable([(grid_x, grid_y, navigable)])
+
+    def update_navigable(self, changes):
+        """
+        Apply a batch of navigability changes at once
+
+        Only what depends on the changed cells is updated: the neighour
+        masks around them, the path cache entries through them, and
+        whatever the subscribed planners and indexes worked out from
+        them.  Everything else is kept.
+
+        @type self: Grid
+        @type changes: iterable[(int, int, bool)]
+           the x, y and new navigability of each cell to change
+        @rtype: None
+
+        >>> g = Grid("", ["B.++", ".+..", "...T"])
+        >>> g.update_navigable([(1, 0, False), (1, 1, True)])
+        >>> print(g.plot_path(g.boat, g.treasure))
+        B+++
+        .**.
+        ...T
+        """
+        width = self.width
+        height = self.height
+        changes = list(changes)
+        # check the whole batch first, so a rejected batch changes nothing
+        for grid_x, grid_y, _ in changes:
+            if not (0 <= grid_x < width and 0 <= grid_y < height):
+                raise IndexError('cell ({}, {}) is off the map'.format(
+                    grid_x, grid_y))
+        if self._copy_on_write:
+            # masks read by other grids or processes are never written to
+            self._own_masks()
+        navigable = self._navigable
+        # digest the chart as loaded before the first change, so that it
+        # can be followed one cell at a time from then on
+        self.fingerprint()
+        # the value of each cell before the batch, to skip no-op changes
+        before = {}
+        for grid_x, grid_y, flag in changes:
+            index = grid_y * width + grid_x
+            before.setdefault(index, navigable[index])
+            navigable[index] = 1 if flag else 0
+        changed = [index for index, value in before.items()
+                   if navigable[index] != value]
+        if not changed:
+            return
+        cells = [(index % width, index // width) for index in changed]
+        # the nodes already made keep up with the mask
+        if self.compact:
+            nodes = self.map._nodes
+            for index in changed:
+                if index in nodes:
+                    nodes[index].navigable = navigable[index] == 1
+        else:
+            for grid_x, grid_y in cells:
+                self.map[grid_x][grid_y].navigable = (
+                    navigable[grid_y * width + grid_x] == 1)
+        if self._adjacency is not None:
+            self._update_neighour_index(cells)
+        # new water may join bodies and new land split them
+        self._update_components(changed)
+        self._update_fingerprint(changed)
+        for listener in list(self._listeners):
+            listener.update_cells(cells)
+
+    def _update_neighour_index(self, cells):
+        """
+        Set the bit of every move onto <cells> to their navigability
+
+        @type self: Grid
+        @type cells: list[(int, int)]
+        @rtype: None
+        """
+        width = self.width
+        height = self.height
+        adjacency = self._adjacency
+        for grid_x, grid_y in cells:
+            value = self._navigable[grid_y * width + grid_x]
+            for bit, (delta_x, delta_y, _) in enumerate(NEIGHBOUR_DELTAS):
+                # the neighour that reaches this cell with move <bit>
+                from_x = grid_x - delta_x
+                from_y = grid_y - delta_y
+                if 0 <= from_x < width and 0 <= from_y < height:
+                    if value:
+                        adjacency[from_y * width + from_x] |= 1 << bit
+                    else:
+                        adjacency[from_y * width + from_x] &= ~(1 << bit)
+
+    def _update_fingerprint(self, changed):
+        """
+        Fold the cells at indices <changed> into the fingerprint, and
+        note the change for the cached paths from before it
+
+        Each cell has a digest of its own that is xor-ed in or out, so
+        the fingerprint changes in time proportional to the change, and
+        changing a cell back restores the old fingerprint.  The path
+        cache is not visited: find_path follows the changes back from a
+        missing entry with _earlier_keys instead.
+
+        @type self: Grid
+        @type changed: list[int]
+        @rtype: None
+        """
+        old = self._fingerprint
+        value = int.from_bytes(old, 'little')
+        for index in changed:
+            value ^= int.from_bytes(hashlib.blake2b(
+                struct.pack('<Q', index), digest_size=len(old),
+                person=b'grid cell').digest(), 'little')
+        self._fingerprint = value.to_bytes(len(old), 'little')
+        self._changes.append((old, frozenset(changed), any(
+            self._navigable[index] for index in changed)))
+        del self._changes[:-_CHANGES_KEPT]
+
+    def _earlier_keys(self, key):
+        """
+        Yield the path cache key of the query <key> on the chart as it was
+        before each of the last changes, newest first, each with a check
+        of whether a path cached under it is still right
+
+        @type self: Grid
+        @type key: tuple
+        @rtype: Iterator[(tuple, Callable[[tuple[int]], bool])]
+        """
+        changed = frozenset()
+        opened = False
+        for fingerprint, cells, cells_opened in reversed(self._changes):
+            changed |= cells
+            opened = opened or cells_opened
+            yield ((fingerprint,) + key[1:],
+                   functools.partial(self._still_right, key, changed, opened))
+
+    def _still_right(self, key, changed, opened, cells):
+        """
+        Return True iff the path <cells> cached for the query <key> is
+        still right after the cells at indices <changed> have changed
+
+        @type self: Grid
+        @type key: tuple
+        @type changed: frozenset[int]
+        @type opened: bool
+           True iff any of the changed cells became navigable
+        @type cells: tuple[int]
+        @rtype: bool
+        """
+        if not changed.isdisjoint(cells):
+            return False
+        if not opened:
+            # new land cannot shorten a path it does not cross
+            return True
+        # a new cell can shorten any path but a straight one
+        if not cells:
+            return False
+        width = self.width
+        start, target = key[2], key[3]
+        cost = sum(octile(b % width - a % width, b // width - a // width)
+                   for a, b in zip(cells, cells[1:]))
+        return cost == octile(target % width - start % width,
+                              target // width - start // width)
+
+    def _new_search(self):
+        """
+        Return the scratch state of this grid, reset for a new search
+
+        @type self: Grid
+        @rtype: SearchState
+        """
+        if self._search is None:
+            self._search = SearchState(self.width * self.height)
+        else:
+            self._search.reset()
+        return self._search
+
+    def _publish(self, search, start):
+        """
+        Store gcost, hcost and parent of every cell reached by <search>
+        on its Node, after clearing what the previous search stored
+
+        Only nodes touched by the two searches are visited.
+
+        @type self: Grid
+        @type search: SearchState
+        @type start: int
+            the index of the start cell, whose hcost is left unset
+        @rtype: None
+        """
+        # clear the nodes of the previous search
+        for node in self._published:
+            node.reset()
+        width = self.width
+        published = []
+        # loop the cells reached by this search
+        for index in search.touched:
+            node = self.map[index % width][index // width]
+            node.set_gcost(search.gcost[index])
+            if index != start:
+                node.set_hcost(search.fcost[index] - search.gcost[index])
+            parent_index = search.parent[index]
+            if parent_index >= 0:
+                node.set_parent(
+                    self.map[parent_index % width][parent_index // width])
+            published.append(node)
+        self._published = published
 
     def retrace_path(self, start_node, target_node):
         """
@@ -681,7 +2837,7 @@ class Grid:
         ...     print(n.grid_x, n.grid_y,
         ...         n.gcost, n.hcost, n.fcost(),
         ...         n.in_path)
-        0 0 0 1.7976931348623157e+308 1.7976931348623157e+308 True
+        0 0 0 9223372036854775807 9223372036854775807 True
         1 0 10 28 38 True
         2 1 24 14 38 True
         3 2 38 0 38 True
@@ -767,41 +2923,8 @@ class Grid:
         self.find_path(start_node, target_node)
         # get the nodes on the path
         path_nodes = self.retrace_path(start_node, target_node)
-        # create an empty list of strings
-        strings = []
-        # zip the map
-        _map = zip(*self.map)
-        # loop the row in the map
-        for row in _map:
-            # create an empty string
-            string = ''
-            # loop the node in the row
-            for node in row:
-                # if the node is not navigable
-                if not node.navigable:
-                    # add the plus symbol to the big string
-                    string += '+'
-                # otherwise
-                else:
-                    # if the node is the boat
-                    if node is self.boat:
-                        # add B to the big string
-                        string += 'B'
-                    # else if the node is the treasure
-                    elif node is self.treasure:
-                        # add T to the bug string
-                        string += 'T'
-                    # else if the node is in the path of nodes
-                    elif node in path_nodes:
-                        # add star symbol to the big string
-                        string += '*'
-                    # otherwise
-                    else:
-                        # it is not navigable, and add the dot to the string
-                        string += '.'
-            # add the big string to the list of strings
-            strings.append(string)
-        return '\n'.join(strings)
+        # draw the map with the path on it
+        return self.render(path_nodes)
 
 
 if __name__ == '__main__':
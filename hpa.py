@@ -0,0 +1,544 @@
+"""Hierarchical pathfinding
+
+This module contains the Hierarchy class, an abstraction of a Grid for
+hierarchical path-finding A-star (HPA*).
+
+The chart is cut into square clusters.  Wherever water crosses the
+border between two clusters, a pair of entrance cells, one on each side,
+is linked by an inter-cluster edge.  The entrances of each cluster are
+linked by intra-cluster edges carrying the cost of the shortest path
+between them inside the cluster.  A query inserts its two endpoints into
+this small abstract graph, searches it, and refines each abstract edge
+into cells with a search confined to a single cluster.  The entrances
+are found when the hierarchy is built; the intra-cluster edges of a
+cluster are worked out the first time a search reaches it, or all at once
+by Hierarchy.prepare, and kept until a cell of the cluster changes.
+
+Paths found this way are not always the shortest, but every cell that
+can be reached on the grid can be reached through the abstract graph.
+"""
+
+import heapq
+import sys
+
+from grid import octile
+
+# the default side of a cluster, in cells
+CLUSTER_SIZE = 16
+
+# a run of crossable border cells at least this long gets an entrance at
+# each end instead of a single one in the middle
+_LONG_RUN = 6
+
+
+def _search_box(adjacency, moves, width, source, box, goals):
+    """
+    Run Dijkstra from cell <source> without leaving <box>, until every
+    cell in <goals> is settled or nothing is left to expand
+
+    Return the costs of the goals that were reached and the parent of
+    every cell in the box, for _route_box.
+
+    @type adjacency: bytearray
+    @type moves: tuple[tuple[(int, int, int, int)]]
+    @type width: int
+    @type source: int
+    @type box: (int, int, int, int)
+       the first column and row inside the box, and the first outside
+    @type goals: set[int]
+    @rtype: (dict[int, int], list[int])
+    """
+    left, top, right, bottom = box
+    span = right - left
+    # the hierarchy runs thousands of these small searches while it is
+    # built, so their state lives in lists over the box alone and the
+    # frontier is a plain heap of (cost, cell) pairs, in which an
+    # improved cell is pushed again and its stale pair skipped
+    unreached = sys.maxsize
+    costs = [unreached] * (span * (bottom - top))
+    parents = [-1] * len(costs)
+    costs[(source // width - top) * span + source % width - left] = 0
+    remaining = len(goals) - (source in goals)
+    frontier = [(0, source)]
+    while remaining and frontier:
+        curr_cost, curr = heapq.heappop(frontier)
+        curr_x = curr % width
+        curr_y = curr // width
+        local = (curr_y - top) * span + curr_x - left
+        if curr_cost > costs[local]:
+            continue
+        if curr in goals and curr != source:
+            remaining -= 1
+        for delta, step, delta_x, delta_y in moves[adjacency[curr]]:
+            if not (left <= curr_x + delta_x < right and
+                    top <= curr_y + delta_y < bottom):
+                continue
+            cost = curr_cost + step
+            next_local = local + delta_y * span + delta_x
+            if cost < costs[next_local]:
+                costs[next_local] = cost
+                parents[next_local] = curr
+                heapq.heappush(frontier, (cost, curr + delta))
+    found = {}
+    for goal in goals:
+        cost = costs[(goal // width - top) * span + goal % width - left]
+        if goal != source and cost != unreached:
+            found[goal] = cost
+    return found, parents
+
+
+def _route_box(parents, width, box, cell):
+    """
+    Return the cells from the source of a _search_box to <cell>
+
+    @type parents: list[int]
+       the parents returned by _search_box
+    @type width: int
+    @type box: (int, int, int, int)
+    @type cell: int
+    @rtype: list[int]
+    """
+    left, top, right, _ = box
+    path = []
+    while cell >= 0:
+        path.append(cell)
+        cell = parents[(cell // width - top) * (right - left) +
+                       cell % width - left]
+    path.reverse()
+    return path
+
+
+class Hierarchy:
+    """
+    An abstract graph over the clusters of a Grid
+
+    === Attributes ===
+    @type grid: Grid
+       the grid this hierarchy abstracts
+    @type cluster_size: int
+       the side of a cluster, in cells
+    @type columns: int
+       the number of clusters across the grid
+    @type rows: int
+       the number of clusters down the grid
+    @type _transitions: dict[(str, int, int), list[(int, int, int)]]
+       the entrance pairs and their move cost on each cluster border;
+       borders are keyed by kind and the cluster they start from:
+       'v' to the cluster on the right, 'h' to the one below, 'd' to the
+       one below and right and 'a' from the cluster on the right to the
+       one below
+    @type _entrances: dict[int, set[int]]
+       the entrance cells of each cluster
+    @type _inter: dict[int, dict[int, int]]
+       the edges between entrances of neighbouring clusters
+    @type _intra: dict[int, dict[int, int]]
+       the edges between entrances of the same cluster
+    @type _stale: set[int]
+       the clusters whose intra-cluster edges are not worked out yet
+    """
+
+    def __init__(self, grid, cluster_size=CLUSTER_SIZE):
+        """
+        Build the abstract graph of <grid>
+
+        @type self: Hierarchy
+        @type grid: Grid
+        @type cluster_size: int
+        @rtype: None
+
+        >>> from grid import Grid
+        >>> h = Hierarchy(Grid("", ["B...", "..+.", "+.+.", "...T"]), 2)
+        >>> h.columns, h.rows
+        (2, 2)
+        >>> sorted(h._entrances[0])
+        [1, 5]
+        >>> h.prepare()
+        >>> h._intra[1]
+        {5: 10}
+        """
+        if cluster_size < 2:
+            raise ValueError("clusters must be at least 2 cells across")
+        self.grid = grid
+        self.cluster_size = cluster_size
+        self.columns = -(-grid.width // cluster_size)
+        self.rows = -(-grid.height // cluster_size)
+        self._transitions = {}
+        self._entrances = {}
+        self._inter = {}
+        self._intra = {}
+        for cluster_y in range(self.rows):
+            for cluster_x in range(self.columns):
+                for border in (('v', cluster_x, cluster_y),
+                               ('h', cluster_x, cluster_y),
+                               ('d', cluster_x, cluster_y),
+                               ('a', cluster_x, cluster_y)):
+                    self._build_border(border)
+        self._stale = set(range(self.columns * self.rows))
+        grid.subscribe(self)
+
+    def prepare(self):
+        """
+        Work out the intra-cluster edges of every cluster now, rather
+        than when searches first reach them
+
+        @type self: Hierarchy
+        @rtype: None
+        """
+        for cluster in sorted(self._stale):
+            self._build_cluster(cluster)
+        self._stale.clear()
+
+    def cluster_of(self, index):
+        """
+        Return the cluster holding the cell at <index>
+
+        @type self: Hierarchy
+        @type index: int
+        @rtype: int
+        """
+        width = self.grid.width
+        size = self.cluster_size
+        return (index // width // size) * self.columns + index % width // size
+
+    def _box(self, cluster):
+        """
+        Return the columns and rows covered by <cluster>
+
+        @type self: Hierarchy
+        @type cluster: int
+        @rtype: (int, int, int, int)
+        """
+        size = self.cluster_size
+        left = cluster % self.columns * size
+        top = cluster // self.columns * size
+        return (left, top, min(left + size, self.grid.width),
+                min(top + size, self.grid.height))
+
+    def _crossings(self, border):
+        """
+        Return the clusters on each side of <border> and the pairs of
+        cells facing each other across it, in order along the border
+
+        Return None if the border runs off the grid.
+
+        @type self: Hierarchy
+        @type border: (str, int, int)
+        @rtype: (int, int, list[(int, int)]), None
+        """
+        kind, cluster_x, cluster_y = border
+        size = self.cluster_size
+        width = self.grid.width
+        if kind == 'v':
+            if cluster_x + 1 >= self.columns:
+                return None
+            column = (cluster_x + 1) * size - 1
+            pairs = [(y * width + column, y * width + column + 1)
+                     for y in range(cluster_y * size,
+                                    min((cluster_y + 1) * size,
+                                        self.grid.height))]
+            return (cluster_y * self.columns + cluster_x,
+                    cluster_y * self.columns + cluster_x + 1, pairs)
+        if kind == 'h':
+            if cluster_y + 1 >= self.rows:
+                return None
+            row = (cluster_y + 1) * size - 1
+            pairs = [(row * width + x, (row + 1) * width + x)
+                     for x in range(cluster_x * size,
+                                    min((cluster_x + 1) * size, width))]
+            return (cluster_y * self.columns + cluster_x,
+                    (cluster_y + 1) * self.columns + cluster_x, pairs)
+        if cluster_x + 1 >= self.columns or cluster_y + 1 >= self.rows:
+            return None
+        corner = ((cluster_y + 1) * size - 1) * width + (cluster_x + 1) * size
+        if kind == 'd':
+            return (cluster_y * self.columns + cluster_x,
+                    (cluster_y + 1) * self.columns + cluster_x + 1,
+                    [(corner - 1, corner + width)])
+        return (cluster_y * self.columns + cluster_x + 1,
+                (cluster_y + 1) * self.columns + cluster_x,
+                [(corner, corner + width - 1)])
+
+    def _build_border(self, border):
+        """
+        Find the entrances on <border> and link them across it
+
+        Every maximal run of straight crossings gets one entrance pair in
+        its middle, or one at each end if it is long.  A diagonal crossing
+        that touches no straight crossing gets an entrance pair of its
+        own, so every way across the border is represented.
+
+        @type self: Hierarchy
+        @type border: (str, int, int)
+        @rtype: None
+        """
+        crossings = self._crossings(border)
+        if crossings is None:
+            return
+        first, second, pairs = crossings
+        navigable = self.grid.navigability()
+        straight = [navigable[a] and navigable[b] for a, b in pairs]
+        transitions = []
+        if border[0] in 'da':
+            if straight[0]:
+                transitions.append(pairs[0] + (14,))
+        else:
+            start = None
+            for i, crossable in enumerate(straight + [False]):
+                if crossable and start is None:
+                    start = i
+                elif not crossable and start is not None:
+                    if i - start >= _LONG_RUN:
+                        transitions.append(pairs[start] + (10,))
+                        transitions.append(pairs[i - 1] + (10,))
+                    else:
+                        transitions.append(pairs[(start + i - 1) // 2] + (10,))
+                    start = None
+            for i in range(len(pairs) - 1):
+                if straight[i] or straight[i + 1]:
+                    continue
+                for a, b in ((pairs[i][0], pairs[i + 1][1]),
+                             (pairs[i + 1][0], pairs[i][1])):
+                    if navigable[a] and navigable[b]:
+                        transitions.append((a, b, 14))
+        self._transitions[border] = transitions
+        for a, b, cost in transitions:
+            self._entrances.setdefault(first, set()).add(a)
+            self._entrances.setdefault(second, set()).add(b)
+            self._inter.setdefault(a, {})[b] = cost
+            self._inter.setdefault(b, {})[a] = cost
+
+    def _drop_border(self, border):
+        """
+        Remove the entrance links on <border>
+
+        @type self: Hierarchy
+        @type border: (str, int, int)
+        @rtype: None
+        """
+        for a, b, _ in self._transitions.pop(border, ()):
+            for cell, other in ((a, b), (b, a)):
+                links = self._inter.get(cell)
+                if links is not None:
+                    links.pop(other, None)
+                    if not links:
+                        del self._inter[cell]
+
+    def _build_cluster(self, cluster):
+        """
+        Link every pair of entrances of <cluster> that are connected
+        inside it, by the cost of the shortest path between them
+
+        @type self: Hierarchy
+        @type cluster: int
+        @rtype: None
+        """
+        adjacency, moves = self.grid.neighour_index()
+        entrances = sorted(self._entrances.get(cluster, ()))
+        box = self._box(cluster)
+        for entrance in entrances:
+            self._intra[entrance] = {}
+        for i, entrance in enumerate(entrances):
+            # costs are symmetric, so each pair is searched once
+            found, _ = _search_box(adjacency, moves, self.grid.width,
+                                   entrance, box, set(entrances[i + 1:]))
+            for other, cost in found.items():
+                self._intra[entrance][other] = cost
+                self._intra[other][entrance] = cost
+
+    def _borders_of(self, cluster):
+        """
+        Return the keys of every border of <cluster>
+
+        @type self: Hierarchy
+        @type cluster: int
+        @rtype: list[(str, int, int)]
+        """
+        cluster_x = cluster % self.columns
+        cluster_y = cluster // self.columns
+        return [('v', cluster_x, cluster_y), ('v', cluster_x - 1, cluster_y),
+                ('h', cluster_x, cluster_y), ('h', cluster_x, cluster_y - 1),
+                ('d', cluster_x, cluster_y),
+                ('d', cluster_x - 1, cluster_y - 1),
+                ('a', cluster_x - 1, cluster_y),
+                ('a', cluster_x, cluster_y - 1)]
+
+    def update_cells(self, cells):
+        """
+        Rebuild the part of the abstract graph affected by a change of
+        navigability at <cells>
+
+        Only the borders of the clusters holding or bordering a changed
+        cell are rebuilt, and only the clusters on those borders have
+        their intra-cluster edges worked out again, when next needed.
+        The grid calls this on every hierarchy built on it.
+
+        @type self: Hierarchy
+        @type cells: iterable[(int, int)]
+           the coordinates of the cells that changed
+        @rtype: None
+        """
+        size = self.cluster_size
+        changed = set()
+        for x, y in cells:
+            # a cell on a cluster edge also changes the crossings of the
+            # clusters around it
+            for delta_x in (-1, 0, 1):
+                for delta_y in (-1, 0, 1):
+                    if (0 <= x + delta_x < self.grid.width and
+                            0 <= y + delta_y < self.grid.height):
+                        changed.add((y + delta_y) // size * self.columns +
+                                    (x + delta_x) // size)
+        borders = {border for cluster in changed
+                   for border in self._borders_of(cluster)
+                   if border in self._transitions}
+        # every cluster on a rebuilt border gets new entrances
+        clusters = set(changed)
+        for border in borders:
+            first, second, _ = self._crossings(border)
+            clusters.update((first, second))
+        for cluster in clusters:
+            for entrance in self._entrances.pop(cluster, ()):
+                self._intra.pop(entrance, None)
+        for border in borders:
+            self._drop_border(border)
+        # the untouched borders of those clusters keep their entrances
+        for cluster in clusters:
+            for border in self._borders_of(cluster):
+                if border in self._transitions and border not in borders:
+                    first, second, _ = self._crossings(border)
+                    for a, b, _ in self._transitions[border]:
+                        if first == cluster:
+                            self._entrances.setdefault(cluster, set()).add(a)
+                        if second == cluster:
+                            self._entrances.setdefault(cluster, set()).add(b)
+        for border in borders:
+            self._build_border(border)
+        self._stale.update(clusters)
+
+    def find_path(self, start, target):
+        """
+        Return the cells of a path from cell <start> to cell <target>,
+        or [] if there is none
+
+        The path is found on the abstract graph and refined cluster by
+        cluster, so it is close to, but not always, the shortest.
+
+        @type self: Hierarchy
+        @type start: int
+           the index y * width + x of the start cell
+        @type target: int
+           the index of the target cell
+        @rtype: list[int]
+
+        >>> from grid import Grid
+        >>> h = Hierarchy(Grid("", ["B...", "..+.", "+.+.", "...T"]), 2)
+        >>> h.find_path(0, 15)
+        [0, 1, 2, 7, 11, 15]
+        >>> h.find_path(0, 6)
+        []
+        """
+        if start == target:
+            return [start]
+        # no move ends on land
+        if not self.grid.navigability()[target]:
+            return []
+        adjacency, moves = self.grid.neighour_index()
+        width = self.grid.width
+        start_cluster = self.cluster_of(start)
+        target_cluster = self.cluster_of(target)
+        if start_cluster == target_cluster:
+            box = self._box(start_cluster)
+            found, parents = _search_box(adjacency, moves, width, start,
+                                         box, {target})
+            if found:
+                return _route_box(parents, width, box, target)
+        # link the endpoints to the entrances of their clusters
+        exits, _ = _search_box(
+            adjacency, moves, width, start, self._box(start_cluster),
+            self._entrances.get(start_cluster, set()))
+        arrivals, _ = _search_box(
+            adjacency, moves, width, target, self._box(target_cluster),
+            self._entrances.get(target_cluster, set()))
+        abstract = self._search_abstract(start, target, exits, arrivals)
+        if not abstract:
+            return []
+        path = [start]
+        for curr, next_cell in zip(abstract, abstract[1:]):
+            cluster = self.cluster_of(curr)
+            if cluster != self.cluster_of(next_cell):
+                path.append(next_cell)
+                continue
+            box = self._box(cluster)
+            _, parents = _search_box(adjacency, moves, width, curr, box,
+                                     {next_cell})
+            path.extend(_route_box(parents, width, box, next_cell)[1:])
+        return path
+
+    def _search_abstract(self, start, target, exits, arrivals):
+        """
+        Return the cells of the cheapest route from <start> to <target>
+        through the abstract graph, or [] if there is none
+
+        @type self: Hierarchy
+        @type start: int
+        @type target: int
+        @type exits: dict[int, int]
+           the cost from start to each entrance it reaches
+        @type arrivals: dict[int, int]
+           the cost from each entrance that reaches target
+        @rtype: list[int]
+        """
+        width = self.grid.width
+        target_x = target % width
+        target_y = target // width
+        gcost = {start: 0}
+        parents = {start: -1}
+        closed = set()
+        frontier = [(0, start)]
+        while frontier:
+            _, curr = heapq.heappop(frontier)
+            if curr == target:
+                return self._walk(parents, target)
+            if curr in closed:
+                continue
+            closed.add(curr)
+            links = list(self._inter.get(curr, {}).items())
+            # the start may not be an entrance, but reaches the entrances
+            # of its cluster all the same
+            if curr == start:
+                links.extend(exits.items())
+            else:
+                cluster = self.cluster_of(curr)
+                if cluster in self._stale:
+                    self._build_cluster(cluster)
+                    self._stale.discard(cluster)
+                links.extend(self._intra.get(curr, {}).items())
+            if curr in arrivals:
+                links.append((target, arrivals[curr]))
+            for cell, step in links:
+                if cell in closed:
+                    continue
+                cost = gcost[curr] + step
+                if cost < gcost.get(cell, cost + 1):
+                    gcost[cell] = cost
+                    parents[cell] = curr
+                    heapq.heappush(frontier, (cost + octile(
+                        cell % width - target_x, cell // width - target_y),
+                        cell))
+        return []
+
+    @staticmethod
+    def _walk(parents, cell):
+        """
+        Return the cells from the root of <parents> to <cell>
+
+        @type parents: dict[int, int]
+        @type cell: int
+        @rtype: list[int]
+        """
+        path = []
+        while cell >= 0:
+            path.append(cell)
+            cell = parents[cell]
+        path.reverse()
+        return path
@@ -0,0 +1,175 @@
+"""Path cache
+
+This module contains the PathCache class, a least-recently-used cache of
+search results that Grid.find_path consults before searching.
+
+Entries are keyed on a fingerprint of the chart's navigability together
+with the search algorithm and the endpoints, so one cache can serve every
+Grid loaded from the same chart.
+"""
+
+import time
+from collections import OrderedDict
+
+
+class PathCache:
+    """
+    A least-recently-used cache of paths with an optional time to live
+
+    === Attributes ===
+    @type maxsize: int
+       the most entries kept; the least recently used goes first
+    @type ttl: float, None
+       the seconds an entry stays valid, or None to keep it until evicted
+    @type hits: int
+       the number of lookups answered from the cache
+    @type misses: int
+       the number of lookups that found no valid entry
+    @type _clock: callable
+       returns the current time in seconds
+    @type _entries: OrderedDict[object, (object, float)]
+       each key's value and the time it expires, least recently used first
+    """
+
+    def __init__(self, maxsize=128, ttl=None, clock=time.monotonic):
+        """
+        Create an empty PathCache
+
+        @type self: PathCache
+        @type maxsize: int
+        @type ttl: float, None
+        @type clock: callable
+        @rtype: None
+
+        >>> cache = PathCache(2)
+        >>> cache.put('a', (1, 2))
+        >>> cache.get('a'), cache.get('b')
+        ((1, 2), None)
+        >>> cache.hits, cache.misses
+        (1, 1)
+        """
+        if maxsize < 1:
+            raise ValueError("a path cache holds at least one entry")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        """
+        Return the number of entries held, including expired ones not
+        looked up since they expired
+
+        @type self: PathCache
+        @rtype: int
+        """
+        return len(self._entries)
+
+    def get(self, key, older=()):
+        """
+        Return the value stored under <key>, or None if there is no valid
+        entry for it
+
+        Failing an entry under key, the entries under the keys in <older>
+        are tried in turn, and the first valid one whose value check
+        accepts is also stored under key, with the same expiry time, and
+        returned.  So entries need not be moved to new keys up front:
+        they are looked for only when asked for, and only as far back as
+        needed.
+
+        @type self: PathCache
+        @type key: object
+        @type older: Iterable[(object, Callable[[object], bool])]
+           (key, check) pairs of entries that may stand in for key
+        @rtype: object
+
+        >>> now = [0]
+        >>> cache = PathCache(ttl=10, clock=lambda: now[0])
+        >>> cache.put('a', ())
+        >>> now[0] = 11
+        >>> print(cache.get('a'), len(cache))
+        None 0
+        >>> cache.put(('old', 1), (1, 2))
+        >>> cache.get(('new', 1), [(('old', 1), lambda value: False)])
+        >>> cache.get(('new', 1), [(('old', 1), lambda value: True)])
+        (1, 2)
+        >>> cache.get(('new', 1))
+        (1, 2)
+        """
+        entry = self._valid(key)
+        if entry is None:
+            for old_key, check in older:
+                entry = self._valid(old_key)
+                if entry is not None and check(entry[0]):
+                    self._store(key, entry)
+                    break
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def _valid(self, key):
+        """
+        Return the (value, expiry time) stored under <key>, or None if
+        there is no valid entry for it, dropping an expired one
+
+        @type self: PathCache
+        @type key: object
+        @rtype: (object, float), None
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires = entry[1]
+            if expires is None or self._clock() < expires:
+                return entry
+            del self._entries[key]
+        return None
+
+    def put(self, key, value):
+        """
+        Store <value> under <key>, evicting the least recently used entry
+        if the cache is full
+
+        @type self: PathCache
+        @type key: object
+        @type value: object
+        @rtype: None
+
+        >>> cache = PathCache(2)
+        >>> for key in 'abc':
+        ...     cache.put(key, key)
+        >>> sorted(cache._entries)
+        ['b', 'c']
+        """
+        expires = None if self.ttl is None else self._clock() + self.ttl
+        self._store(key, (value, expires))
+
+    def _store(self, key, entry):
+        """
+        Store the (value, expiry time) <entry> under <key> as the most
+        recently used entry, evicting the least recently used one if the
+        cache is full
+
+        @type self: PathCache
+        @type key: object
+        @type entry: (object, float)
+        @rtype: None
+        """
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop every entry, keeping the hit and miss counts
+
+        @type self: PathCache
+        @rtype: None
+        """
+        self._entries.clear()
@@ -0,0 +1,270 @@
+"""Game server
+
+This module contains the GameServer class, which hosts many games of
+TreasureHunt at once over line based TCP or Unix sockets.
+
+Each connection is one player.  A player starts a game with a line
+"NEW <chart>" and then sends the commands of
+TreasureHunt.process_command, one per line.  Every command is answered
+with the state of the game on a line of its own; PLOT first sends the
+rows of the map with the path drawn, or nothing if no sonar has found
+the treasure yet.  A command that cannot be carried out is answered with
+a line starting with "ERROR".
+
+Each chart is loaded once and every game on it plays on a fork, so a
+game starts without reading or copying the chart.  PLOT searches run on an
+executor, so a long search does not hold up the other players.
+
+Run it as a script:
+
+    python server.py grid.txt --port 8023
+"""
+
+import argparse
+import asyncio
+import os
+
+from grid import Grid
+from treasurehunt import PLANNERS, TreasureHunt
+
+# the port the server listens on by default
+DEFAULT_PORT = 8023
+
+
+def _load_chart(file_path):
+    """
+    Return the Grid in the chart file <file_path>, with the bodies of
+    water worked out for every fork to share
+
+    Games only fork the grid, so it is loaded compact.
+
+    @type file_path: str
+    @rtype: Grid
+    """
+    grid = Grid(file_path, compact=True)
+    if getattr(grid, 'boat', None) is not None:
+        grid.component(grid.boat)
+    return grid
+
+
+class GameServer:
+    """
+    Games of TreasureHunt played over sockets
+
+    === Attributes ===
+    @type charts: dict[str, str]
+       the file path of each chart the players can start a game on, by
+       the name they give in NEW
+    @type sonars: int
+       the number of sonars of every game
+    @type so_range: int
+       the range of the sonars of every game
+    @type planner: str
+       the planner of every game, see TreasureHunt
+    @type sessions: int
+       the number of players connected
+    @type _grids: dict[str, Future]
+       the loaded charts by name, as they are being or have been loaded;
+       games are played on forks, never on these
+    @type _executor: Executor, None
+       runs chart loading and PLOT searches, or None for the default
+       executor of the event loop
+    """
+
+    def __init__(self, charts, sonars, so_range, planner='dstar',
+                 executor=None):
+        """
+        Create a server for games on <charts>
+
+        @type self: GameServer
+        @type charts: dict[str, str]
+        @type sonars: int
+        @type so_range: int
+        @type planner: str
+        @type executor: Executor, None
+        @rtype: None
+        """
+        if planner not in PLANNERS:
+            raise ValueError('unknown planner {!r}'.format(planner))
+        self.charts = charts
+        self.sonars = sonars
+        self.so_range = so_range
+        self.planner = planner
+        self.sessions = 0
+        self._grids = {}
+        self._executor = executor
+
+    async def chart(self, name):
+        """
+        Return the loaded chart <name>, loading it on the first call
+
+        Players asking for a chart while it loads all wait for the same
+        load.
+
+        @type self: GameServer
+        @type name: str
+        @rtype: Grid
+        """
+        if name not in self.charts:
+            raise ValueError('unknown chart {!r}'.format(name))
+        loading = self._grids.get(name)
+        if loading is None:
+            loading = asyncio.get_running_loop().run_in_executor(
+                self._executor, _load_chart, self.charts[name])
+            self._grids[name] = loading
+        try:
+            return await loading
+        except (OSError, ValueError):
+            # let the next player try again
+            if self._grids.get(name) is loading:
+                del self._grids[name]
+            raise
+
+    async def new_game(self, name):
+        """
+        Return a new game on the chart <name>
+
+        @type self: GameServer
+        @type name: str
+        @rtype: TreasureHunt
+        """
+        chart = await self.chart(name)
+        return TreasureHunt(self.charts[name], self.sonars, self.so_range,
+                            self.planner, chart.fork())
+
+    async def respond(self, game, line):
+        """
+        Carry out the command <line> on <game> and return the game the
+        player has now, with the lines of the answer
+
+        @type self: GameServer
+        @type game: TreasureHunt, None
+           the game of the player, or None before the first NEW
+        @type line: str
+        @rtype: (TreasureHunt, list[str])
+        """
+        if line.startswith('NEW '):
+            try:
+                game = await self.new_game(line[4:].strip())
+            except (OSError, ValueError) as error:
+                return game, ['ERROR {}'.format(error)]
+            return game, [game.state]
+        if game is None:
+            return game, ['ERROR no game, send NEW <chart>']
+        if line == 'PLOT':
+            # searching may take a while on a large chart
+            plot = await asyncio.get_running_loop().run_in_executor(
+                self._executor, game.plot)
+            return game, ([] if plot is None else plot.split('\n')) + [
+                game.state]
+        return game, [game.process_command(line)]
+
+    async def handle(self, reader, writer):
+        """
+        Play the games of the player connected through <reader> and
+        <writer> until they disconnect
+
+        @type self: GameServer
+        @type reader: StreamReader
+        @type writer: StreamWriter
+        @rtype: None
+        """
+        self.sessions += 1
+        game = None
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # the line is longer than any command
+                    break
+                if not line:
+                    break
+                line = line.decode('ascii', 'replace').strip()
+                if not line:
+                    continue
+                game, answer = await self.respond(game, line)
+                writer.write(''.join(
+                    text + '\n' for text in answer).encode(
+                        'ascii', 'replace'))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve_tcp(self, host=None, port=DEFAULT_PORT):
+        """
+        Return a server accepting players on TCP <host> and <port>
+
+        @type self: GameServer
+        @type host: str, None
+           the address to listen on, or None for every interface
+        @type port: int
+        @rtype: asyncio.Server
+        """
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def serve_unix(self, path):
+        """
+        Return a server accepting players on the Unix socket <path>
+
+        @type self: GameServer
+        @type path: str
+        @rtype: asyncio.Server
+        """
+        return await asyncio.start_unix_server(self.handle, path)
+
+
+async def _serve_forever(game_server, args):
+    """
+    Serve games with <game_server> on the socket chosen in <args>
+
+    @type game_server: GameServer
+    @type args: argparse.Namespace
+    @rtype: None
+    """
+    if args.unix is not None:
+        server = await game_server.serve_unix(args.unix)
+    else:
+        server = await game_server.serve_tcp(args.host, args.port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    """
+    Serve games on the charts named on the command line <argv>
+
+    @type argv: list[str], None
+       the arguments, or None for those of this process
+    @rtype: None
+    """
+    parser = argparse.ArgumentParser(
+        description='Host games of treasure hunt over sockets.')
+    parser.add_argument('charts', nargs='+',
+                        help='chart files, offered by their name without '
+                             'the extension')
+    parser.add_argument('--host', default=None,
+                        help='the address to listen on, every one if unset')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', default=None,
+                        help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--sonars', type=int, default=3)
+    parser.add_argument('--range', type=int, default=38, dest='so_range')
+    parser.add_argument('--planner', default='dstar', choices=PLANNERS)
+    args = parser.parse_args(argv)
+    charts = {os.path.splitext(os.path.basename(path))[0]: path
+              for path in args.charts}
+    game_server = GameServer(charts, args.sonars, args.so_range,
+                             args.planner)
+    asyncio.run(_serve_forever(game_server, args))
+
+
+if __name__ == '__main__':
+    main()
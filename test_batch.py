@@ -0,0 +1,60 @@
+import io
+import json
+import os.path as op
+
+import pytest
+
+import batch
+from test_grid import FIND_PATH_FILES, TESTS_ROOT_DIR, load_find_path_grid, \
+    reference_cost
+
+FIND_PATH_DIR = op.join(TESTS_ROOT_DIR, 'find_path')
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES)
+def test_solve_chart(grid_filename):
+    result = batch.solve_chart(op.join(FIND_PATH_DIR, grid_filename))
+    g = load_find_path_grid(grid_filename)
+    assert result['cost'] == reference_cost(g, g.boat, g.treasure)
+    assert result['path'][0] == [g.boat.grid_x, g.boat.grid_y]
+    assert result['path'][-1] == [g.treasure.grid_x, g.treasure.grid_y]
+
+
+def test_solve_chart_reports_bad_charts(tmp_path):
+    no_treasure = tmp_path / 'no_treasure.txt'
+    no_treasure.write_text('B..\n.+.\n')
+    assert 'error' in batch.solve_chart(str(no_treasure))
+    assert 'error' in batch.solve_chart(str(tmp_path / 'missing.txt'))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_solve_charts_covers_every_chart(workers):
+    files = batch.chart_files([FIND_PATH_DIR])
+    assert [op.basename(f) for f in files] == FIND_PATH_FILES
+    results = list(batch.solve_charts(files, workers=workers, chunk_size=3))
+    assert sorted(r['file'] for r in results) == sorted(files)
+    expected = {f: batch.solve_chart(f) for f in files}
+    assert all(r == expected[r['file']] for r in results)
+
+
+def test_main_writes_json_lines():
+    out = io.StringIO()
+    batch.main([FIND_PATH_DIR, '--workers', '2', '--algorithm', 'jps'], out)
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert len(results) == len(FIND_PATH_FILES)
+    for result in results:
+        g = load_find_path_grid(op.basename(result['file']))
+        assert result['cost'] == reference_cost(g, g.boat, g.treasure)
+
+
+def test_solve_queries_on_shared_chart():
+    g = load_find_path_grid(FIND_PATH_FILES[2])
+    water = [(n.grid_x, n.grid_y) for column in g.map for n in column
+             if n.navigable]
+    queries = [((g.boat.grid_x, g.boat.grid_y), cell) for cell in water[::9]]
+    results = list(batch.solve_queries(g, queries, workers=2, chunk_size=4))
+    assert sorted(tuple(map(tuple, (r['start'], r['target'])))
+                  for r in results) == sorted(queries)
+    for result in results:
+        target = g.map[result['target'][0]][result['target'][1]]
+        assert result['cost'] == reference_cost(g, g.boat, target)
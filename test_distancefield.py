@@ -0,0 +1,82 @@
+import os
+import os.path as op
+import random
+
+import pytest
+
+from distancefield import DistanceField
+from grid import Grid
+
+TESTS_ROOT_DIR = op.dirname(op.abspath(__file__))
+FIND_PATH_FILES = sorted(os.listdir(op.join(TESTS_ROOT_DIR, 'find_path')))
+
+
+def load_find_path_grid(grid_filename):
+    """Return the Grid stored in find_path/<grid_filename>, without its path."""
+    with open(op.join(TESTS_ROOT_DIR, 'find_path', grid_filename), 'r') as ifh:
+        grid_data = ifh.read().strip()
+    return Grid("", grid_data.replace('*', '.').split('\n'))
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES)
+def test_distances_match_find_path(grid_filename):
+    g = load_find_path_grid(grid_filename)
+    field = DistanceField(g)
+    water = [n for column in g.map for n in column if n.navigable]
+    for start in water[::max(1, len(water) // 40)]:
+        g.find_path(start, g.treasure)
+        expected = g.retrace_path(start, g.treasure)
+        if start is g.treasure:
+            assert field.distance(start) == 0
+        elif expected:
+            assert field.distance(start) == g.treasure.gcost
+        else:
+            assert field.distance(start) is None
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES)
+def test_path_follows_distances(grid_filename):
+    g = load_find_path_grid(grid_filename)
+    field = DistanceField(g)
+    path = field.path(g.boat)
+    if field.distance(g.boat) is None:
+        assert path == []
+        return
+    assert path[0] is g.boat and path[-1] is g.treasure
+    for a, b in zip(path, path[1:]):
+        assert b.navigable
+        assert field.next_node(a) is b
+        assert field.distance(a) == field.distance(b) + a.distance(b)
+    assert field.next_node(g.treasure) is None
+
+
+def test_other_target_and_unreachable_cells():
+    g = Grid("", ["B.+..", "..+..", "++++.", "....T"])
+    field = DistanceField(g, g.map[1][1])
+    assert field.distance(g.boat) == 14
+    assert field.distance(g.treasure) is None
+    assert field.path(g.treasure) == []
+    assert field.distance(g.map[2][0]) is None
+
+
+def test_distances_are_int32():
+    g = Grid("", ["B.++", ".+..", "...T"])
+    field = DistanceField(g)
+    assert field.distances.itemsize == 4
+    assert len(field.distances) == g.width * g.height
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES)
+def test_update_cells_matches_fresh_field(grid_filename):
+    g = load_find_path_grid(grid_filename)
+    field = DistanceField(g)
+    rng = random.Random(grid_filename)
+    for _ in range(10):
+        g.update_navigable([(rng.randrange(g.width), rng.randrange(g.height),
+                             rng.random() < 0.4) for _ in range(8)])
+        fresh = DistanceField(g)
+        assert field.distances == fresh.distances
+        path = field.path(g.boat)
+        for a, b in zip(path, path[1:]):
+            assert b.navigable
+            assert field.distance(a) == field.distance(b) + a.distance(b)
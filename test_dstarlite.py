@@ -0,0 +1,71 @@
+import os
+import os.path as op
+
+import pytest
+
+from dstarlite import DStarLite
+from grid import Grid
+
+TESTS_ROOT_DIR = op.dirname(op.abspath(__file__))
+FIND_PATH_FILES = sorted(os.listdir(op.join(TESTS_ROOT_DIR, 'find_path')))
+
+
+def load_find_path_grid(grid_filename):
+    """Return the Grid stored in find_path/<grid_filename>, without its path."""
+    with open(op.join(TESTS_ROOT_DIR, 'find_path', grid_filename), 'r') as ifh:
+        grid_data = ifh.read().strip()
+    return Grid("", grid_data.replace('*', '.').split('\n'))
+
+
+def path_cost(path):
+    """Return the total cost of walking along path."""
+    return sum(a.distance(b) for a, b in zip(path, path[1:]))
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES)
+def test_distances_follow_the_boat(grid_filename):
+    g = load_find_path_grid(grid_filename)
+    planner = DStarLite(g)
+    water = [n for column in g.map for n in column if n.navigable]
+    for start in water[::max(1, len(water) // 25)]:
+        g.find_path(start, g.treasure)
+        expected = g.retrace_path(start, g.treasure)
+        path = planner.path(start)
+        if start is g.treasure:
+            assert planner.distance(start) == 0
+        elif expected:
+            assert planner.distance(start) == g.treasure.gcost
+            assert path_cost(path) == g.treasure.gcost
+            assert path[0] is start and path[-1] is g.treasure
+            assert all(a.distance(b) in (10, 14)
+                       for a, b in zip(path, path[1:]))
+        else:
+            assert planner.distance(start) is None
+            assert path == []
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES)
+def test_steps_along_the_path_cost_little(grid_filename):
+    g = load_find_path_grid(grid_filename)
+    planner = DStarLite(g)
+    path = planner.path(g.boat)
+    first = planner.expanded
+    for node in path[1:]:
+        assert planner.path(node)[0] is node
+        assert planner.distance(node) == path_cost(planner.path(node))
+    assert planner.expanded - first <= len(path)
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES)
+def test_update_cells_matches_fresh_planner(grid_filename):
+    g = load_find_path_grid(grid_filename)
+    planner = DStarLite(g)
+    path = planner.path(g.boat)
+    if len(path) < 4:
+        return
+    # block the middle of the path, then reopen one of the cells
+    changed = [(n.grid_x, n.grid_y) for n in path[len(path) // 2:][:3]]
+    g.update_navigable([(x, y, False) for x, y in changed])
+    assert planner.distance(g.boat) == DStarLite(g).distance(g.boat)
+    g.set_navigable(changed[1][0], changed[1][1], True)
+    assert planner.distance(g.boat) == DStarLite(g).distance(g.boat)
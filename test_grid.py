@@ -1,13 +1,51 @@
+import heapq
 import os
 import os.path as op
+import random
+import struct
 import tempfile
+from multiprocessing import shared_memory
 
 import pytest
 
+import grid
 from grid import Grid, Node
 from grid_parameters import DIRECTIONS, GRID_TEST_DATA
+from hpa import Hierarchy
+from pathcache import PathCache
 
 TESTS_ROOT_DIR = op.dirname(op.abspath(__file__))
+FIND_PATH_FILES = sorted(os.listdir(op.join(TESTS_ROOT_DIR, 'find_path')))
+
+
+def load_find_path_grid(grid_filename):
+    """Return the Grid stored in find_path/<grid_filename>, without its path."""
+    with open(op.join(TESTS_ROOT_DIR, 'find_path', grid_filename), 'r') as ifh:
+        grid_data = ifh.read().strip()
+    return Grid("", grid_data.replace('*', '.').split('\n'))
+
+
+def reference_cost(grid, start, target):
+    """Return the optimal path cost from start to target by plain Dijkstra."""
+    dist = {(start.grid_x, start.grid_y): 0}
+    heap = [(0, start.grid_x, start.grid_y)]
+    while heap:
+        cost, x, y = heapq.heappop(heap)
+        if (x, y) == (target.grid_x, target.grid_y):
+            return cost
+        if cost > dist[(x, y)]:
+            continue
+        for n in grid.get_neighours(grid.map[x][y]):
+            new_cost = cost + grid.map[x][y].distance(n)
+            if new_cost < dist.get((n.grid_x, n.grid_y), new_cost + 1):
+                dist[(n.grid_x, n.grid_y)] = new_cost
+                heapq.heappush(heap, (new_cost, n.grid_x, n.grid_y))
+    return None
+
+
+def path_cost(path):
+    """Return the total cost of walking along path."""
+    return sum(a.distance(b) for a, b in zip(path, path[1:]))
 
 
 @pytest.mark.parametrize("grid_data", GRID_TEST_DATA)
@@ -166,3 +204,606 @@ def test_plot_path(grid_data):
     text_grid = grid_data.grid.strip().split('\n')
     g = Grid("", text_grid)
     assert g.plot_path(g.boat, g.treasure).strip() in [s.strip() for s in grid_data.grid_solutions]
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES)
+def test_find_path_optimal(grid_filename):
+    """Test that find_path relaxes nodes and finds an optimal path."""
+    g = load_find_path_grid(grid_filename)
+    g.find_path(g.boat, g.treasure)
+    path = g.retrace_path(g.boat, g.treasure)
+    assert path_cost(path) == reference_cost(g, g.boat, g.treasure)
+    assert g.treasure.gcost == path_cost(path)
+
+
+def test_find_path_repeated_queries():
+    """Test that one Grid answers many path queries back to back."""
+    g = load_find_path_grid(FIND_PATH_FILES[0])
+    water = [n for column in g.map for n in column if n.navigable]
+    pairs = [(water[i], water[(i * 7919) % len(water)])
+             for i in range(0, len(water), len(water) // 25)]
+    for start, target in pairs + pairs[::-1]:
+        g.find_path(start, target)
+        path = g.retrace_path(start, target)
+        expected = reference_cost(g, start, target)
+        if expected is None:
+            assert path == []
+        else:
+            assert path_cost(path) == expected
+            assert sum(n.in_path for column in g.map for n in column) == len(path)
+
+
+@pytest.mark.parametrize("grid_data", GRID_TEST_DATA)
+def test_compact_grid(grid_data):
+    """Test that a compact Grid behaves like a full one."""
+    text_grid = grid_data.grid.strip().split('\n')
+    full = Grid("", text_grid)
+    compact = Grid("", text_grid, compact=True)
+    assert compact.map == full.map
+    assert (compact.width, compact.height) == (full.width, full.height)
+    assert str(compact) == str(full)
+    assert compact.boat == full.boat and compact.treasure == full.treasure
+    assert compact.map[compact.boat.grid_x][compact.boat.grid_y] is compact.boat
+    assert compact.plot_path(compact.boat, compact.treasure) == \
+        full.plot_path(full.boat, full.treasure)
+
+
+def test_compact_grid_creates_nodes_lazily():
+    """Test that a compact Grid only creates the Nodes that are used."""
+    text_grid = GRID_TEST_DATA[2].grid.strip().split('\n')
+    g = Grid("", text_grid, compact=True)
+    str(g)
+    assert len(g.map._nodes) == 2
+    g.find_path(g.boat, g.treasure)
+    assert len(g.retrace_path(g.boat, g.treasure)) == 100
+    assert len(g.map._nodes) < g.width * g.height // 10
+
+
+@pytest.mark.filterwarnings("error::ResourceWarning")
+@pytest.mark.parametrize("compact", [False, True])
+def test_init_from_file_streams_and_closes(compact):
+    """Test that a grid file is parsed row by row and closed afterwards."""
+    text = GRID_TEST_DATA[0].grid
+    with tempfile.NamedTemporaryFile(mode='wt', suffix='.txt') as grid_file:
+        # blank lines and trailing whitespace are not part of the map
+        grid_file.write('\n' + text.replace('\n', ' \n') + '\n\n')
+        grid_file.flush()
+        g = Grid(grid_file.name, compact=compact)
+    assert str(g) == text.strip()
+    assert (g.width, g.height) == (7, 5)
+
+
+@pytest.mark.parametrize("grid_data", GRID_TEST_DATA)
+@pytest.mark.parametrize("compact", [False, True])
+def test_binary_round_trip(grid_data, compact):
+    """Test that save_binary and load_binary keep the whole grid."""
+    g = Grid("", grid_data.grid.strip().split('\n'))
+    g.move('S')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        chart_path = op.join(tmp_dir, 'chart.bin')
+        g.save_binary(chart_path)
+        loaded = Grid.load_binary(chart_path, compact=compact)
+    assert loaded.compact == compact
+    assert (loaded.width, loaded.height) == (g.width, g.height)
+    assert loaded.map == g.map
+    assert str(loaded) == str(g)
+    assert loaded.plot_path(loaded.boat, loaded.treasure) == \
+        g.plot_path(g.boat, g.treasure)
+
+
+def test_load_binary_rejects_text_chart():
+    with tempfile.NamedTemporaryFile(mode='wt') as grid_file:
+        grid_file.write(GRID_TEST_DATA[0].grid * 4)
+        grid_file.flush()
+        with pytest.raises(ValueError):
+            Grid.load_binary(grid_file.name)
+
+
+@pytest.mark.parametrize("keep", [0, 10, 32, -1])
+def test_load_binary_rejects_truncated_chart(keep, tmp_path):
+    g = Grid("", GRID_TEST_DATA[2].grid.strip().split('\n'))
+    chart_path = str(tmp_path / 'chart.bin')
+    g.save_binary(chart_path)
+    with open(chart_path, 'rb') as chart_file:
+        chart = chart_file.read()
+    with open(chart_path, 'wb') as chart_file:
+        chart_file.write(chart[:keep])
+    with pytest.raises(ValueError):
+        Grid.load_binary(chart_path)
+
+
+def test_load_binary_rejects_boat_off_the_chart(tmp_path):
+    g = Grid("", ["B.++", ".+..", "...T"])
+    chart_path = str(tmp_path / 'chart.bin')
+    g.save_binary(chart_path)
+    with open(chart_path, 'r+b') as chart_file:
+        # the boat x follows the magic, the version, the width and height
+        chart_file.seek(16)
+        chart_file.write(struct.pack('<i', 4))
+    with pytest.raises(ValueError):
+        Grid.load_binary(chart_path)
+
+
+def test_rows_cut_to_the_shortest_row():
+    rng = random.Random(3)
+    rows = [''.join(rng.choice('.+') for _ in range(60 - y // 2))
+            for y in range(80)]
+    rows[0] = 'B' + rows[0][1:]
+    rows[-1] = 'T' + rows[-1][1:]
+    g = Grid("", rows)
+    assert (g.width, g.height) == (21, 80)
+    assert str(g).split('\n') == [row[:21] for row in rows]
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES[:4])
+def test_numpy_and_pure_python_agree(grid_filename, monkeypatch):
+    """Test that the optional NumPy paths match the pure Python ones."""
+    pytest.importorskip('numpy')
+    with open(op.join(TESTS_ROOT_DIR, 'find_path', grid_filename), 'r') as ifh:
+        text = ifh.read().strip().replace('*', '.') + '\n'
+    results = []
+    for use_numpy in (True, False):
+        if not use_numpy:
+            monkeypatch.setattr(grid, 'numpy', None)
+        with tempfile.NamedTemporaryFile(mode='wt') as grid_file:
+            grid_file.write(text)
+            grid_file.flush()
+            g = Grid(grid_file.name)
+        results.append((g.width, g.height, g._navigable, str(g),
+                        g.plot_path(g.boat, g.treasure)))
+    assert results[0] == results[1]
+    assert results[0][3] == text.strip()
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES[:4])
+def test_get_neighours_matches_bounds_checks(grid_filename):
+    """Test the adjacency index against plain bounds and island checks."""
+    g = load_find_path_grid(grid_filename)
+    for x in range(g.width):
+        for y in range(g.height):
+            expected = [(x + dx, y + dy) for dy, dx in
+                        ((1, 0), (-1, 0), (0, 1), (0, -1),
+                         (1, 1), (1, -1), (-1, 1), (-1, -1))
+                        if 0 <= x + dx < g.width and 0 <= y + dy < g.height
+                        and g.map[x + dx][y + dy].navigable]
+            actual = [(n.grid_x, n.grid_y) for n in g.get_neighours(g.map[x][y])]
+            assert actual == expected
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES)
+def test_jps_matches_astar_cost(grid_filename):
+    """Test that Jump Point Search finds paths as short as A-star's."""
+    g = load_find_path_grid(grid_filename)
+    water = [n for column in g.map for n in column if n.navigable]
+    pairs = [(g.boat, g.treasure)] + [
+        (water[i], water[(i * 7919 + 13) % len(water)])
+        for i in range(0, len(water), len(water) // 15)]
+    for start, target in pairs:
+        g.find_path(start, target)
+        expected = g.retrace_path(start, target)
+        g.find_path(start, target, 'jps')
+        path = g.retrace_path(start, target)
+        assert path_cost(path) == path_cost(expected)
+        assert bool(path) == bool(expected)
+        # consecutive path nodes are neighours
+        assert all(a.distance(b) in (10, 14) for a, b in zip(path, path[1:]))
+        if path:
+            assert target.gcost == path_cost(path)
+
+
+def test_jps_expands_fewer_nodes_on_open_sea():
+    """Test Jump Point Search on the 100x100 open sea of grid_2."""
+    g = Grid("", GRID_TEST_DATA[2].grid.strip().split('\n'))
+    g.find_path(g.boat, g.treasure)
+    astar_expanded = g._search.expanded
+    assert g.plot_path(g.boat, g.treasure).strip() == \
+        GRID_TEST_DATA[2].grid_solutions[0].strip()
+    g.find_path(g.boat, g.treasure, 'jps')
+    assert len(g.retrace_path(g.boat, g.treasure)) == 100
+    assert g._search.expanded * 10 < astar_expanded
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES)
+def test_bidirectional_matches_astar_cost(grid_filename):
+    """Test that bidirectional A-star finds paths as short as A-star's."""
+    g = load_find_path_grid(grid_filename)
+    water = [n for column in g.map for n in column if n.navigable]
+    pairs = [(g.boat, g.treasure), (g.boat, g.boat)] + [
+        (water[i], water[(i * 7919 + 13) % len(water)])
+        for i in range(0, len(water), len(water) // 15)]
+    for start, target in pairs:
+        g.find_path(start, target)
+        expected = g.retrace_path(start, target)
+        g.find_path(start, target, 'bidirectional')
+        path = g.retrace_path(start, target)
+        assert path_cost(path) == path_cost(expected)
+        assert bool(path) == bool(expected)
+        assert all(a.distance(b) in (10, 14) for a, b in zip(path, path[1:]))
+        if path:
+            assert path[0] is start and path[-1] is target
+            assert [n.gcost for n in path] == \
+                [path_cost(path[:i + 1]) for i in range(len(path))]
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES)
+def test_hpa_finds_valid_paths(grid_filename):
+    """Test hierarchical paths against A-star on small clusters."""
+    g = load_find_path_grid(grid_filename)
+    g.hierarchy(4)
+    water = [n for column in g.map for n in column if n.navigable]
+    pairs = [(g.boat, g.treasure)] + [
+        (water[i], water[(i * 7919 + 13) % len(water)])
+        for i in range(0, len(water), len(water) // 15)]
+    for start, target in pairs:
+        g.find_path(start, target)
+        expected = g.retrace_path(start, target)
+        g.find_path(start, target, 'hpa')
+        path = g.retrace_path(start, target)
+        assert bool(path) == bool(expected)
+        assert path_cost(path) >= path_cost(expected)
+        assert all(a.distance(b) in (10, 14) for a, b in zip(path, path[1:]))
+        assert all(n.navigable for n in path[1:])
+        if path:
+            assert target.gcost == path_cost(path)
+
+
+def test_hpa_update_matches_rebuild():
+    """Test that updating a hierarchy gives the same one as rebuilding it."""
+    g = load_find_path_grid(FIND_PATH_FILES[0])
+    hierarchy = g.hierarchy(4)
+    hierarchy.prepare()
+    changed = [(3, 3), (4, 4), (7, 8), (8, 7), (0, 11), (g.width - 1, 5)]
+    g.update_navigable([(x, y, not g.map[x][y].navigable) for x, y in changed])
+    hierarchy.prepare()
+    rebuilt = Hierarchy(g, 4)
+    rebuilt.prepare()
+    assert hierarchy._transitions == rebuilt._transitions
+    assert hierarchy._entrances == rebuilt._entrances
+    assert hierarchy._inter == rebuilt._inter
+    assert hierarchy._intra == rebuilt._intra
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES)
+def test_path_cache_serves_repeated_plots(grid_filename):
+    g = load_find_path_grid(grid_filename)
+    expected = g.plot_path(g.boat, g.treasure)
+    cost = g.treasure.gcost
+    g.path_cache = PathCache(8)
+    assert g.plot_path(g.boat, g.treasure) == expected
+    # a second grid from the same chart shares the entries
+    other = load_find_path_grid(grid_filename)
+    other.path_cache = g.path_cache
+    assert other.plot_path(other.boat, other.treasure) == expected
+    assert other.treasure.gcost == cost
+    assert (g.path_cache.hits, g.path_cache.misses) == (1, 1)
+    # the search was skipped: only the path itself was published
+    assert len(other._published) == len(
+        other.retrace_path(other.boat, other.treasure))
+
+
+def test_path_cache_keys_on_chart_and_algorithm():
+    cache = PathCache(8)
+    a = Grid("", ["B.++", ".+..", "...T"])
+    b = Grid("", ["B.++", "++..", "...T"])
+    a.path_cache = b.path_cache = cache
+    a.find_path(a.boat, a.treasure)
+    a.find_path(a.boat, a.treasure, 'jps')
+    b.find_path(b.boat, b.treasure)
+    assert cache.misses == 3 and cache.hits == 0
+    b.find_path(b.boat, b.treasure)
+    assert [(n.grid_x, n.grid_y) for n in b.retrace_path(b.boat, b.treasure)] \
+        == [(0, 0), (1, 0), (2, 1), (3, 2)]
+    assert cache.hits == 1
+
+
+def test_unreachable_target_skips_the_search():
+    g = Grid("", ["B.+...", "..+...", "+++..T"])
+    g.path_cache = PathCache(8)
+    # the first search finds no path and labels the chart
+    g.find_path(g.boat, g.treasure)
+    assert g.retrace_path(g.boat, g.treasure) == []
+    assert g._search.expanded == 4 and g.path_cache.misses == 1
+    g.find_path(g.map[1][1], g.treasure)
+    assert g.retrace_path(g.map[1][1], g.treasure) == []
+    assert g._search.expanded == 0 and g._search.touched == []
+    assert g.path_cache.misses == 1
+    # opening the channel joins the two bodies of water
+    g.set_navigable(2, 1, True)
+    assert g.reachable(g.boat, g.treasure)
+    g.find_path(g.boat, g.treasure)
+    assert g.treasure.gcost == reference_cost(g, g.boat, g.treasure)
+
+
+def test_searches_label_the_chart_only_once_one_finds_no_path():
+    g = load_find_path_grid(FIND_PATH_FILES[0])
+    g.find_path(g.boat, g.treasure)
+    assert g.retrace_path(g.boat, g.treasure)
+    f = g.fork()
+    f.find_path(f.boat, f.treasure)
+    assert g._components is None and f._components is None
+    g.component(g.boat)
+    assert g.fork()._components is g._components
+
+
+def test_component_labels_match_flood_fill():
+    rng = random.Random(5)
+    rows = [''.join(rng.choice('..+') for _ in range(40)) for _ in range(30)]
+    g = Grid("", rows)
+    water = [n for column in g.map for n in column if n.navigable]
+    for start in water[::7]:
+        flooded = {start}
+        stack = [start]
+        while stack:
+            for n in g.get_neighours(stack.pop()):
+                if n not in flooded:
+                    flooded.add(n)
+                    stack.append(n)
+        for node in water:
+            assert (g.component(node) == g.component(start)) == \
+                (node in flooded)
+    assert all(g.component(n) == 0
+               for column in g.map for n in column if not n.navigable)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_update_navigable_matches_fresh_grid(compact):
+    g = load_find_path_grid(FIND_PATH_FILES[0])
+    if compact:
+        g = Grid("", str(g).split('\n'), compact=True)
+    g.find_path(g.boat, g.treasure)
+    nodes = [g.map[x][y] for x in range(g.width) for y in range(g.height)]
+    rng = random.Random(17)
+    for _ in range(20):
+        g.update_navigable([(rng.randrange(g.width), rng.randrange(g.height),
+                             rng.random() < 0.5) for _ in range(5)])
+        fresh = Grid("", str(g).split('\n'))
+        assert g._adjacency == fresh.neighour_index()[0]
+        assert g.map == fresh.map
+        assert [n.navigable for n in nodes] == \
+            [fresh.map[n.grid_x][n.grid_y].navigable for n in nodes]
+        g.find_path(g.boat, g.treasure)
+        fresh.find_path(fresh.boat, fresh.treasure)
+        assert g.treasure.gcost == fresh.treasure.gcost
+
+
+def test_update_navigable_rejects_cells_off_the_map():
+    g = Grid("", ["B.++", ".+..", "...T"])
+    with pytest.raises(IndexError):
+        g.set_navigable(4, 0, True)
+
+
+def test_rejected_batch_leaves_the_grid_unchanged():
+    g = Grid("", ["B.++", ".+..", "...T"])
+    g.find_path(g.boat, g.treasure)
+    fingerprint = g.fingerprint()
+    with pytest.raises(IndexError):
+        g.update_navigable([(1, 0, False), (9, 9, True)])
+    assert str(g) == "B.++\n.+..\n...T"
+    assert g.map[1][0].navigable and g.fingerprint() == fingerprint
+    g.find_path(g.boat, g.treasure)
+    assert [(n.grid_x, n.grid_y) for n in g.retrace_path(g.boat, g.treasure)] \
+        == [(0, 0), (1, 0), (2, 1), (3, 2)]
+
+
+def test_fingerprint_follows_changes():
+    g = Grid("", ["B.++", ".+..", "...T"])
+    original = g.fingerprint()
+    g.set_navigable(1, 1, True)
+    changed = g.fingerprint()
+    assert changed != original
+    other = Grid("", ["B.++", ".+..", "...T"])
+    other.set_navigable(1, 1, True)
+    assert other.fingerprint() == changed
+    g.set_navigable(1, 1, False)
+    assert g.fingerprint() == original
+
+
+def test_path_cache_keeps_paths_away_from_changes():
+    g = Grid("", ["B.....", "......", "......", ".....T", "++++++"])
+    g.path_cache = PathCache(8)
+    g.find_path(g.boat, g.treasure)
+    g.find_path(g.map[0][3], g.treasure)
+    straight = [(n.grid_x, n.grid_y) for n in g.retrace_path(g.map[0][3],
+                                                              g.treasure)]
+    # blocking a cell off both paths keeps both
+    g.set_navigable(0, 2, False)
+    g.find_path(g.boat, g.treasure)
+    g.find_path(g.map[0][3], g.treasure)
+    assert g.path_cache.hits == 2
+    # blocking a cell on the path drops it
+    x, y = straight[2]
+    g.set_navigable(x, y, False)
+    g.find_path(g.map[0][3], g.treasure)
+    assert g.path_cache.hits == 2
+    assert (x, y) not in [(n.grid_x, n.grid_y)
+                          for n in g.retrace_path(g.map[0][3], g.treasure)]
+    # opening a cell keeps only paths no new cell can shorten
+    g.set_navigable(0, 4, True)
+    g.find_path(g.boat, g.treasure)
+    assert g.path_cache.hits == 3
+    g.find_path(g.map[0][3], g.treasure)
+    assert g.path_cache.hits == 3
+
+
+def test_changes_leave_the_path_cache_alone():
+    g = Grid("", ["B.....", "......", "......", ".....T", "++++++"])
+    g.path_cache = PathCache(64)
+    for x in range(5, -1, -1):
+        g.find_path(g.map[x][0], g.treasure)
+    x, y = [(n.grid_x, n.grid_y)
+            for n in g.retrace_path(g.map[0][0], g.treasure)][2]
+    # the cache is only looked at when a path is asked for
+    g.update_navigable([(0, 4, False), (1, 4, False)])
+    g.set_navigable(x, y, False)
+    assert len(g.path_cache) == 6
+    # the path from (5, 0) is followed back through both changes
+    g.find_path(g.map[5][0], g.treasure)
+    assert g.path_cache.hits == 1 and len(g.path_cache) == 7
+    g.find_path(g.map[0][0], g.treasure)
+    assert g.path_cache.hits == 1
+    assert g.treasure.gcost == reference_cost(g, g.map[0][0], g.treasure)
+
+
+def test_find_path_unknown_algorithm():
+    g = Grid("", GRID_TEST_DATA[0].grid.strip().split('\n'))
+    with pytest.raises(ValueError):
+        g.find_path(g.boat, g.treasure, 'dfs')
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES[:4])
+def test_find_paths_matches_find_path(grid_filename):
+    g = load_find_path_grid(grid_filename)
+    rng = random.Random(grid_filename)
+    water = [n for column in g.map for n in column if n.navigable]
+    land = [n for column in g.map for n in column if not n.navigable]
+    targets = rng.sample(water, min(6, len(water))) + land[:1] + [g.boat]
+    results = g.find_paths(g.boat, targets)
+    assert len(results) == len(targets)
+    for target, (path, cost) in zip(targets, results):
+        expected = reference_cost(g, g.boat, target)
+        if target is g.boat:
+            assert (path, cost) == ([], 0)
+        elif expected is None:
+            assert (path, cost) == ([], None)
+        else:
+            assert cost == expected == path_cost(path)
+            assert path[0] is g.boat and path[-1] is target
+
+
+@pytest.mark.parametrize("grid_filename", FIND_PATH_FILES[:4])
+def test_find_nearest_picks_the_closest_start(grid_filename):
+    g = load_find_path_grid(grid_filename)
+    rng = random.Random(grid_filename)
+    water = [n for column in g.map for n in column if n.navigable]
+    starts = rng.sample(water, min(5, len(water))) + [g.boat]
+    costs = [reference_cost(g, start, g.treasure) for start in starts]
+    winner, path = g.find_nearest(starts, g.treasure)
+    if all(cost is None for cost in costs):
+        assert (winner, path) == (None, [])
+    else:
+        best = min(cost for cost in costs if cost is not None)
+        assert winner in starts
+        assert reference_cost(g, winner, g.treasure) == best
+        assert path[0] is winner and path[-1] is g.treasure
+        assert path_cost(path) == g.treasure.gcost == best
+
+
+def test_find_nearest_without_a_way_through():
+    g = Grid("", ["B.+...", "..+...", "+++..T"])
+    assert g.find_nearest([g.boat, g.map[1][1]], g.treasure) == (None, [])
+    winner, path = g.find_nearest([g.boat, g.map[3][0]], g.treasure)
+    assert winner is g.map[3][0] and path[-1] is g.treasure
+
+
+def test_many_path_searches_after_new_land_splits_a_body():
+    g = Grid("", ["B.+...", "..+...", "...+.T"])
+    # a search first, so the later ones find slots of an older generation
+    g.find_path(g.boat, g.treasure)
+    assert g.treasure.gcost == reference_cost(g, g.boat, g.treasure)
+    # the labels still join the boat and the treasure after the split
+    g.set_navigable(2, 2, False)
+    assert g.find_paths(g.boat, [g.treasure, g.map[1][1]])[0] == ([], None)
+    assert g.find_nearest([g.boat, g.map[1][1]], g.treasure) == (None, [])
+    assert g.retrace_path(g.boat, g.treasure) == []
+    winner, path = g.find_nearest([g.boat, g.map[4][0]], g.treasure)
+    assert winner is g.map[4][0] and path[-1] is g.treasure
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_shared_memory_grid_searches_like_the_original(compact):
+    g = load_find_path_grid(FIND_PATH_FILES[1])
+    block = g.to_shared_memory()
+    try:
+        shared = Grid.from_shared_memory(block.name, compact)
+        assert str(shared) == str(g)
+        assert shared.fingerprint() == g.fingerprint()
+        for algorithm in ['astar', 'jps', 'hpa']:
+            g.find_path(g.boat, g.treasure, algorithm)
+            shared.find_path(shared.boat, shared.treasure, algorithm)
+            assert shared.plot_path(shared.boat, shared.treasure) == \
+                g.plot_path(g.boat, g.treasure)
+        shared.close()
+    finally:
+        block.close()
+        block.unlink()
+
+
+def test_shared_memory_grid_copies_on_change():
+    g = Grid("", ["B.++", ".+..", "...T"])
+    block = g.to_shared_memory()
+    try:
+        first = Grid.from_shared_memory(block.name)
+        second = Grid.from_shared_memory(block.name)
+        first.set_navigable(1, 0, False)
+        first.find_path(first.boat, first.treasure)
+        assert first.treasure.gcost == 44
+        second.find_path(second.boat, second.treasure)
+        assert second.treasure.gcost == 38
+        assert str(Grid.from_shared_memory(block.name)) == str(g)
+    finally:
+        block.close()
+        block.unlink()
+
+
+def test_from_shared_memory_rejects_other_blocks():
+    block = shared_memory.SharedMemory(create=True, size=64)
+    try:
+        with pytest.raises(ValueError):
+            Grid.from_shared_memory(block.name)
+    finally:
+        block.close()
+        block.unlink()
+
+
+
+def test_fork_copies_masks_on_first_change():
+    g = load_find_path_grid(FIND_PATH_FILES[0])
+    f = g.fork()
+    assert f._navigable is g._navigable and f._adjacency is g._adjacency
+    assert str(f) == str(g)
+    # a change on the original leaves the fork on the chart as it was
+    x, y = g.boat.grid_x, g.boat.grid_y
+    before = str(f)
+    g.set_navigable((x + 1) % g.width, y, False)
+    assert str(f) == before and f._navigable is not g._navigable
+    f.find_path(f.boat, f.treasure)
+    assert f.treasure.gcost == \
+        reference_cost(load_find_path_grid(FIND_PATH_FILES[0]),
+                       f.boat, f.treasure)
+    g.find_path(g.boat, g.treasure)
+    assert g.treasure.gcost == reference_cost(g, g.boat, g.treasure)
+
+
+def test_changes_keep_labels_without_relabelling(monkeypatch):
+    rng = random.Random(11)
+    rows = [''.join(rng.choice('...+') for _ in range(40)) for _ in range(30)]
+    rows[0] = 'B' + rows[0][1:]
+    rows[-1] = rows[-1][:-1] + 'T'
+    g = Grid("", rows)
+    water = [n for column in g.map for n in column if n.navigable]
+    g.find_path(water[0], water[-1])
+    labelled = []
+    label_components = grid._label_components
+    monkeypatch.setattr(grid, '_label_components',
+                        lambda *args: labelled.append(1) or
+                        label_components(*args))
+    g.component(g.boat)
+    for _ in range(40):
+        g.set_navigable(rng.randrange(40), rng.randrange(30),
+                        rng.random() < 0.5)
+        start, target = rng.sample(water, 2)
+        g.find_path(start, target)
+        # the search overrules stale labels, never the other way round
+        assert bool(g.retrace_path(start, target)) == \
+            (reference_cost(g, start, target) is not None)
+    assert len(labelled) == 1
+    # asking for labels after new land works them out once more
+    fresh = Grid("", str(g).split('\n'))
+    fresh.component(fresh.map[0][0])
+    del labelled[1:]
+    for node in water[::5]:
+        for other in water[::7]:
+            assert (g.component(node) == g.component(other)) == \
+                (fresh.component(fresh.map[node.grid_x][node.grid_y]) ==
+                 fresh.component(fresh.map[other.grid_x][other.grid_y]))
+    assert len(labelled) == 2
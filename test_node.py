@@ -1,6 +1,6 @@
 import pytest
 
-from grid import Node
+from grid import NO_COST, Node
 
 
 @pytest.mark.parametrize("hcost, gcost, fcost", [
@@ -63,3 +63,32 @@ def test_lt():
 ])
 def test_str(node, node_string):
     assert str(node) == node_string
+
+
+def test_initial_costs_are_integers():
+    n = Node(True, 0, 0)
+    assert isinstance(n.gcost, int) and isinstance(n.hcost, int)
+    assert n.gcost == n.hcost == NO_COST
+    assert n.fcost() == 2 * NO_COST
+
+
+def test_slots():
+    n = Node(True, 0, 0)
+    assert not hasattr(n, '__dict__')
+    with pytest.raises(AttributeError):
+        n.cost = 3
+
+
+@pytest.mark.parametrize("costs, fcost", [
+    ([('g', 20), ('h', 14)], 34),
+    ([('h', 14), ('g', 20), ('g', 10)], 24),
+    ([('g', 5), ('h', 7), ('h', 0)], 5),
+])
+def test_fcost_follows_setters(costs, fcost):
+    n = Node(True, 0, 0)
+    for kind, cost in costs:
+        if kind == 'g':
+            n.set_gcost(cost)
+        else:
+            n.set_hcost(cost)
+    assert n.fcost() == fcost
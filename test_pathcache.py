@@ -0,0 +1,75 @@
+from pathcache import PathCache
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_counts_hits_and_misses():
+    cache = PathCache(4)
+    assert cache.get('a') is None
+    cache.put('a', (1, 2, 3))
+    assert cache.get('a') == (1, 2, 3)
+    assert cache.get('a') == (1, 2, 3)
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_empty_path_is_a_hit():
+    cache = PathCache(4)
+    cache.put('a', ())
+    assert cache.get('a') == ()
+    assert cache.hits == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = PathCache(3)
+    for key in 'abc':
+        cache.put(key, key)
+    cache.get('a')
+    cache.put('d', 'd')
+    assert len(cache) == 3
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == ['a', 'c', 'd']
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = PathCache(4, ttl=5, clock=clock)
+    cache.put('a', 'a')
+    clock.now = 4.9
+    assert cache.get('a') == 'a'
+    clock.now = 5.0
+    assert cache.get('a') is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_older_entry_stands_in_with_its_expiry():
+    clock = FakeClock()
+    cache = PathCache(4, ttl=5, clock=clock)
+    cache.put('old', (1, 2))
+    checked = []
+    older = [('gone', lambda value: True),
+             ('old', lambda value: checked.append(value) or True)]
+    clock.now = 3
+    assert cache.get('new', older) == (1, 2)
+    assert checked == [(1, 2)] and (cache.hits, cache.misses) == (1, 0)
+    assert cache.get('new') == (1, 2)
+    clock.now = 5
+    assert cache.get('new', older) is None
+    assert len(cache) == 0 and cache.misses == 1
+
+
+def test_clear_keeps_counters():
+    cache = PathCache(4)
+    cache.put('a', 'a')
+    cache.get('a')
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.hits == 1
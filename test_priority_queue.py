@@ -1,6 +1,9 @@
+import random
+
 import pytest
 
-from container import PriorityQueue
+from container import (HeapPriorityQueue, IndexedPriorityQueue, PriorityQueue,
+                       make_priority_queue)
 
 # test_name: (less_than, input_items, output_items)
 PRIORITY_QUEUE_TESTS = {
@@ -20,8 +23,9 @@ PRIORITY_QUEUE_TESTS = {
     "less_than, input_items, output_items",
     PRIORITY_QUEUE_TESTS.values(),
     ids=list(PRIORITY_QUEUE_TESTS.keys()))
-def test_private_queue(less_than, input_items, output_items):
-    pq = PriorityQueue(less_than)
+@pytest.mark.parametrize("queue_class", [PriorityQueue, HeapPriorityQueue])
+def test_private_queue(queue_class, less_than, input_items, output_items):
+    pq = queue_class(less_than)
     for item in input_items:
         pq.add(item)
     assert pq._queue == output_items
@@ -31,9 +35,91 @@ def test_private_queue(less_than, input_items, output_items):
     "less_than, input_items, output_items",
     PRIORITY_QUEUE_TESTS.values(),
     ids=list(PRIORITY_QUEUE_TESTS.keys()))
-def test_remove(less_than, input_items, output_items):
-    pq = PriorityQueue(less_than)
+@pytest.mark.parametrize("queue_class", [PriorityQueue, HeapPriorityQueue])
+def test_remove(queue_class, less_than, input_items, output_items):
+    pq = queue_class(less_than)
     for item in input_items:
         pq.add(item)
+    # copy, since the parametrized lists are shared between engines
+    output_items = list(output_items)
     while not pq.is_empty():
         assert pq.remove() == output_items.pop()
+
+
+@pytest.mark.parametrize(
+    "less_than, input_items, output_items",
+    PRIORITY_QUEUE_TESTS.values(),
+    ids=list(PRIORITY_QUEUE_TESTS.keys()))
+@pytest.mark.parametrize("queue_class",
+                         [PriorityQueue, HeapPriorityQueue, IndexedPriorityQueue])
+def test_peek(queue_class, less_than, input_items, output_items):
+    pq = queue_class(less_than)
+    for item in input_items:
+        pq.add(item)
+    while not pq.is_empty():
+        item = pq.peek()
+        assert pq.remove() == item
+
+
+@pytest.mark.parametrize("engine", ['list', 'heap'])
+def test_interleaved_add_remove(engine):
+    """Test that both engines agree when adds and removes are mixed."""
+    pq = make_priority_queue(lambda a, b: a[0] < b[0], engine)
+    removed = []
+    for i in range(200):
+        pq.add(((i * 37) % 11, i))
+        if i % 3 == 0:
+            removed.append(pq.remove())
+    while not pq.is_empty():
+        removed.append(pq.remove())
+    reference = PriorityQueue(lambda a, b: a[0] < b[0])
+    expected = []
+    for i in range(200):
+        reference.add(((i * 37) % 11, i))
+        if i % 3 == 0:
+            expected.append(reference.remove())
+    while not reference.is_empty():
+        expected.append(reference.remove())
+    assert removed == expected
+
+
+def test_heap_compares_once_per_sift_step():
+    """Test that ties are broken on the insertion counter alone."""
+    calls = []
+    steps = []
+
+    def less_than(a, b):
+        calls.append(1)
+        return a[0] < b[0]
+    pq = HeapPriorityQueue(less_than)
+    before = pq._before
+    pq._before = lambda entry, other: steps.append(1) or before(entry, other)
+    items = [(i % 4, i) for i in range(64)]
+    for item in items:
+        pq.add(item)
+    removed = [pq.remove() for _ in items]
+    assert removed == sorted(items)
+    assert steps and len(calls) == len(steps)
+
+
+def test_indexed_update_and_discard():
+    """Test update and discard against a brute-force minimum."""
+    rng = random.Random(148)
+    cost = {}
+    pq = IndexedPriorityQueue(lambda a, b: cost[a] < cost[b])
+    for step in range(2000):
+        action = rng.random()
+        item = rng.randrange(50)
+        if action < 0.5:
+            cost[item] = rng.randrange(100)
+            pq.add(item)
+        elif action < 0.7 and pq.contains(item):
+            cost[item] = rng.randrange(100)
+            pq.update(item)
+        elif action < 0.8:
+            pq.discard(item)
+        elif not pq.is_empty():
+            queued = [entry[1] for entry in pq._heap]
+            best = min(cost[i] for i in queued)
+            assert cost[pq.remove()] == best
+    assert sorted(pq._positions) == sorted(entry[1] for entry in pq._heap)
@@ -0,0 +1,110 @@
+import asyncio
+import os.path as op
+
+import pytest
+
+from grid_parameters import GRID_TEST_DATA
+from server import GameServer
+
+TESTS_DIR = op.abspath(op.dirname(__file__))
+CHARTS = {'grid': op.join(TESTS_DIR, 'grid.txt')}
+
+
+async def talk(reader, writer, line):
+    """Send line and return the answer, ending with the state line."""
+    writer.write((line + '\n').encode('ascii'))
+    await writer.drain()
+    lines = []
+    while True:
+        line = await reader.readline()
+        if not line:
+            # the server hung up
+            return lines
+        lines.append(line.decode('ascii').rstrip('\n'))
+        if not set(lines[-1]) <= set('.+*BT'):
+            return lines
+
+
+def play(game_server, script):
+    """Run script(reader, writer) against game_server over TCP."""
+    async def run():
+        server = await game_server.serve_tcp('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await script(port)
+    return asyncio.run(run())
+
+
+def test_games_on_one_chart_are_independent():
+    game_server = GameServer(CHARTS, 3, 38)
+    winning = GRID_TEST_DATA[0].winning_commands[0]
+
+    async def script(port):
+        first = await asyncio.open_connection('127.0.0.1', port)
+        second = await asyncio.open_connection('127.0.0.1', port)
+        assert await talk(*first, 'NEW grid') == ['STARTED']
+        assert await talk(*second, 'NEW grid') == ['STARTED']
+        states = [await talk(*first, command) for command in winning]
+        assert states[-1] == ['WON']
+        assert await talk(*second, 'GO S') == ['STARTED']
+        assert await talk(*second, 'SONAR') == ['STARTED']
+        plot = await talk(*second, 'PLOT')
+        assert plot[-1] == 'STARTED'
+        assert '\n'.join(plot[:-1]).replace('*', '.') == \
+            '..+..++\n++....+\n...B.++\n++.....\n.T....+'
+        assert game_server.sessions == 2
+        for _, writer in (first, second):
+            writer.close()
+            await writer.wait_closed()
+        return len(game_server._grids)
+    assert play(game_server, script) == 1
+
+
+def test_errors_are_reported():
+    game_server = GameServer(CHARTS, 3, 38)
+
+    async def script(port):
+        connection = await asyncio.open_connection('127.0.0.1', port)
+        answers = [await talk(*connection, line)
+                   for line in ['GO N', 'NEW sea', 'NEW grid', 'PLOT']]
+        connection[1].close()
+        return answers
+    answers = play(game_server, script)
+    assert [a[0].split()[0] for a in answers[:2]] == ['ERROR', 'ERROR']
+    assert answers[2:] == [['STARTED'], ['STARTED']]
+
+
+def test_non_ascii_lines_are_answered():
+    game_server = GameServer(CHARTS, 3, 38)
+
+    async def script(port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write('NEW m\u00e9r\n'.encode('utf-8'))
+        await writer.drain()
+        error = await reader.readline()
+        answer = await talk(reader, writer, 'NEW grid')
+        writer.close()
+        return error, answer
+    error, answer = play(game_server, script)
+    assert error.startswith(b'ERROR unknown chart')
+    assert answer == ['STARTED']
+
+
+def test_unix_socket(tmp_path):
+    game_server = GameServer(CHARTS, 1, 0)
+    path = str(tmp_path / 'game.sock')
+
+    async def run():
+        server = await game_server.serve_unix(path)
+        async with server:
+            connection = await asyncio.open_unix_connection(path)
+            answers = [await talk(*connection, line)
+                       for line in ['NEW grid', 'SONAR', 'QUIT']]
+            connection[1].close()
+            return answers
+    assert asyncio.run(run()) == [['STARTED'], ['OVER'], ['OVER']]
+
+
+def test_unknown_planner():
+    with pytest.raises(ValueError):
+        GameServer(CHARTS, 1, 1, 'dijkstra')
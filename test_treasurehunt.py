@@ -1,5 +1,6 @@
 import io
 import os.path as op
+import random
 import sys
 import tempfile
 from contextlib import contextmanager
@@ -7,7 +8,7 @@ from contextlib import contextmanager
 import pytest
 
 from grid import Grid
-from grid_parameters import GRID_TEST_DATA
+from grid_parameters import DIRECTIONS, GRID_TEST_DATA
 from treasurehunt import TreasureHunt
 
 TESTS_DIR = op.abspath(op.dirname(__file__))
@@ -135,3 +136,72 @@ def test_process_quit_command(grid_data, check_returned_state):
     assert th.state == 'STARTED'
     state = th.process_command('QUIT')
     assert (state if check_returned_state else th.state) == 'OVER'
+
+
+@pytest.mark.parametrize("grid_data", GRID_TEST_DATA)
+@pytest.mark.parametrize("planner", ['dstar', 'field'])
+def test_plot_after_moves(grid_data, planner):
+    with tempfile.NamedTemporaryFile(mode='wt') as grid_file:
+        grid_file.write(grid_data.grid)
+        grid_file.flush()
+        th = TreasureHunt(grid_file.name, 1, 10 ** 6, planner)
+    th.process_command('SONAR')
+    for command in grid_data.winning_commands[0][:-1]:
+        th.process_command(command)
+        g = Grid("", str(th.grid).split('\n'))
+        g.find_path(g.boat, g.treasure)
+        expected = len(g.retrace_path(g.boat, g.treasure))
+        handle = io.StringIO()
+        with capture_print_statements(handle):
+            th.process_command('PLOT')
+        handle.seek(0)
+        plot = handle.read().strip()
+        assert plot.replace('*', '.') == str(th.grid)
+        assert plot.count('*') == expected - 2
+
+
+def test_unknown_planner():
+    with pytest.raises(ValueError):
+        TreasureHunt(op.join(TESTS_DIR, 'grid.txt'), 1, 1, 'dijkstra')
+
+
+def test_games_share_the_chart(tmp_path):
+    grid_path = tmp_path / 'chart.txt'
+    grid_path.write_text(GRID_TEST_DATA[0].grid)
+    first = TreasureHunt(str(grid_path), 1, 1)
+    second = TreasureHunt(str(grid_path), 1, 1)
+    assert first.grid.navigability() is second.grid.navigability()
+    first.process_command('GO S')
+    assert second.grid.boat.grid_y == first.grid.boat.grid_y - 1
+    # a chart that changed on disk is read again
+    grid_path.write_text(GRID_TEST_DATA[0].grid.replace('.T', 'T.') + '\n')
+    third = TreasureHunt(str(grid_path), 1, 1)
+    assert third.grid.treasure.grid_x == 0
+
+
+@pytest.mark.parametrize("grid_data", GRID_TEST_DATA)
+@pytest.mark.parametrize("seed", range(5))
+def test_run_commands_matches_process_command(grid_data, seed, tmp_path):
+    grid_path = tmp_path / 'chart.txt'
+    grid_path.write_text(grid_data.grid)
+    rng = random.Random(seed)
+    words = ['GO ' + name for name, _, _ in DIRECTIONS] * 4 + \
+        ['SONAR', 'PLOT', 'QUIT', 'GO', 'GO UP', 'DIVE']
+    commands = [rng.choice(words) for _ in range(60)]
+    if seed == 0:
+        commands = grid_data.winning_commands[0] + commands
+    so_range = rng.randrange(10, 60)
+    expected = TreasureHunt(str(grid_path), 3, so_range)
+    trace = []
+    with capture_print_statements(io.StringIO()):
+        for command in commands:
+            trace.append(expected.process_command(command))
+            if trace[-1] in ('WON', 'OVER'):
+                break
+    th = TreasureHunt(str(grid_path), 3, so_range)
+    assert th.run_commands(iter(commands)) == (expected.state, trace)
+    assert th.grid.boat == expected.grid.boat
+    assert th._remaining_sonars == expected._remaining_sonars
+    assert th._treasure_scanned == expected._treasure_scanned
+    if th.state in ('WON', 'OVER'):
+        assert th.run_commands(commands) == (th.state, [])
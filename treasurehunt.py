@@ -6,7 +6,89 @@ Your only task here is to implement the methods
 where indicated, according to their docstring.
 Also complete the missing doctests.
 """
-from grid import Grid
+import functools
+import os
+
+from distancefield import DistanceField
+from dstarlite import DStarLite
+from grid import Grid, octile
+
+# the planners PLOT can use, by name
+PLANNERS = {
+    'field': DistanceField,
+    'dstar': DStarLite,
+}
+
+# the opcodes run_commands turns commands into
+_GO = 0
+_SONAR = 1
+_PLOT = 2
+_QUIT = 3
+_UNSUPPORTED = 4
+
+# the (delta x, delta y) of the boat for each direction of GO
+_DIRECTIONS = {
+    'N': (0, -1), 'S': (0, 1), 'E': (1, 0), 'W': (-1, 0),
+    'NW': (-1, -1), 'NE': (1, -1), 'SW': (-1, 1), 'SE': (1, 1),
+}
+
+
+def _opcode(command):
+    """
+    Return the (opcode, delta x, delta y) that run_commands carries out
+    for <command>, as process_command reads it
+
+    @type command: str
+    @rtype: (int, int, int)
+
+    >>> _opcode('GO SW'), _opcode('GO UP'), _opcode('DIVE')
+    ((0, -1, 1), (0, 0, 0), (4, 0, 0))
+    """
+    if command.startswith('GO'):
+        # an unknown direction leaves the boat where it is
+        delta_x, delta_y = _DIRECTIONS.get(command[3:], (0, 0))
+        return (_GO, delta_x, delta_y)
+    return ({'SONAR': _SONAR, 'PLOT': _PLOT, 'QUIT': _QUIT}.get(
+        command, _UNSUPPORTED), 0, 0)
+
+
+# the opcodes of the commands of a game, looked up rather than parsed
+_OPCODES = {command: _opcode(command) for command in
+            ['GO ' + direction for direction in _DIRECTIONS] +
+            ['SONAR', 'PLOT', 'QUIT']}
+
+
+@functools.lru_cache(maxsize=32)
+def _load_chart(grid_path, modified, size):
+    """
+    Return the Grid in the file grid_path as it was when last modified
+    at <modified> with <size> bytes
+
+    Games are played on forks of the grids returned, never on them, so
+    the grids are compact: no game reads their nodes.  The bodies of water
+    the planners check are worked out here, once, for every fork to share.
+
+    @type grid_path: str
+    @type modified: int
+    @type size: int
+    @rtype: Grid
+    """
+    grid = Grid(grid_path, compact=True)
+    if getattr(grid, 'boat', None) is not None:
+        grid.component(grid.boat)
+    return grid
+
+
+def chart(grid_path):
+    """
+    Return the Grid in the file grid_path, loading it only if it has not
+    been loaded since it last changed
+
+    @type grid_path: str
+    @rtype: Grid
+    """
+    status = os.stat(grid_path)
+    return _load_chart(grid_path, status.st_mtime_ns, status.st_size)
 
 
 class TreasureHunt:
@@ -26,9 +108,12 @@ class TreasureHunt:
     @type state: str
         the state of the game:
           STARTED, OVER, WON
+    @type planner: str
+        the name in PLANNERS of the planner that answers PLOT
     """
 
-    def __init__(self, grid_path, sonars, so_range):
+    def __init__(self, grid_path, sonars, so_range, planner='dstar',
+                 grid=None):
         """
         Initialize a new game with map data stored in the file grid_path
         and commands to be used to play the game in game_path file.
@@ -38,12 +123,22 @@ class TreasureHunt:
            see Grid and Node classes for the format
         @type sonars: int
         @type so_range: int
+        @type planner: str
+           'dstar' to keep a D* Lite search between moves, which is
+           repaired rather than redone after each move, or 'field' to
+           work out the distance to the treasure from every cell at once
+        @type grid: Grid, None
+           the grid to play on, or None for a fork of the chart in
+           grid_path, which is read only by the first game on it
         """
+        if planner not in PLANNERS:
+            raise ValueError('unknown planner {!r}'.format(planner))
         # TODO
         # initialize the grid path
         self.grid_path = grid_path
-        # intitialize the Grid
-        self.grid = Grid(grid_path)
+        # intitialize the Grid, unless one was handed over; a fork shares
+        # the chart and only holds what this game changes
+        self.grid = chart(grid_path).fork() if grid is None else grid
         # initialize the sonars
         self.sonars = sonars
         # initialize the range of sonar
@@ -54,6 +149,9 @@ class TreasureHunt:
         self._remaining_sonars = sonars
         # initialize the scannde treasure as false
         self._treasure_scanned = False
+        # the planner towards the treasure, created by the first PLOT
+        self.planner = planner
+        self._planner = None
 
     def process_command(self, command):
         """
@@ -146,6 +244,12 @@ class TreasureHunt:
                     if self.state == 'STARTED':
                         # the state changes to OVER
                         self.state = 'OVER'
+        # else if the command is PLOT
+        elif command == 'PLOT':
+            # the path can only be plotted once the treasure is found
+            plot = self.plot()
+            if plot is not None:
+                print(plot)
         # else if the command is QUIT
         elif command == 'QUIT':
             self.state = 'OVER'
@@ -155,6 +259,112 @@ class TreasureHunt:
 
         return self.state
 
+    def run_commands(self, commands):
+        """
+        Process the commands in <commands> in order, as process_command
+        would, until the game is WON or OVER, and return the final state
+        of the game with the state after each command processed
+
+        The commands are looked up as opcodes and the boat moves on the
+        navigability mask, so no command string is matched and no Node is
+        touched until the end.  PLOT does not change the state, so it is
+        skipped rather than drawn.
+
+        @type self: TreasureHunt
+        @type commands: Iterable[str]
+        @rtype: (str, list[str])
+
+        >>> th = TreasureHunt('grid.txt', 3, 38)
+        >>> th.run_commands(['GO S', 'SONAR', 'GO SW', 'GO SW', 'GO N'])
+        ('WON', ['STARTED', 'STARTED', 'STARTED', 'WON'])
+        >>> th.grid.boat == th.grid.treasure
+        True
+        """
+        state = self.state
+        trace = []
+        if state in ('WON', 'OVER'):
+            return state, trace
+        grid = self.grid
+        width = grid.width
+        height = grid.height
+        navigable = grid.navigability()
+        x = start_x = grid.boat.grid_x
+        y = start_y = grid.boat.grid_y
+        treasure_x = grid.treasure.grid_x
+        treasure_y = grid.treasure.grid_y
+        remaining = self._remaining_sonars
+        scanned = self._treasure_scanned
+        opcodes = _OPCODES
+        for command in commands:
+            kind, delta_x, delta_y = (opcodes.get(command) or
+                                      _opcode(command))
+            if kind == _GO:
+                # move if the cell is on the map and navigable
+                next_x = x + delta_x
+                next_y = y + delta_y
+                if (0 <= next_x < width and 0 <= next_y < height and
+                        navigable[next_y * width + next_x]):
+                    x = next_x
+                    y = next_y
+                if x == treasure_x and y == treasure_y and (
+                        state == 'STARTED'):
+                    state = 'WON'
+            elif kind == _SONAR:
+                if remaining == 0:
+                    state = 'run out of sonars!'
+                else:
+                    remaining -= 1
+                    if not scanned and octile(
+                            treasure_x - x, treasure_y - y) <= self.so_range:
+                        scanned = True
+                    if remaining == 0 and state == 'STARTED':
+                        state = 'OVER'
+            elif kind == _QUIT:
+                state = 'OVER'
+            elif kind == _UNSUPPORTED:
+                state = 'unsupported command!'
+            trace.append(state)
+            if state == 'WON' or state == 'OVER':
+                break
+        # write back what the commands changed
+        if x != start_x or y != start_y:
+            grid.boat = grid.map[x][y]
+        self.state = state
+        self._remaining_sonars = remaining
+        self._treasure_scanned = scanned
+        return state, trace
+
+    def plot(self):
+        """
+        Return the grid map with the shortest path from the boat to the
+        treasure drawn in "*", or None if no sonar has found the treasure
+
+        This is the search behind the PLOT command, which prints it.
+
+        @type self: TreasureHunt
+        @rtype: str, None
+
+        >>> th = TreasureHunt('grid.txt', 3, 38)
+        >>> th.plot() is None
+        True
+        >>> th.process_command('SONAR')
+        'STARTED'
+        >>> print(th.plot())
+        ..+..++
+        ++.B..+
+        ...*.++
+        ++*....
+        .T....+
+        """
+        if not self._treasure_scanned:
+            return None
+        # the treasure never moves, so one planner serves every PLOT and
+        # keeps what it worked out between moves
+        if self._planner is None:
+            self._planner = PLANNERS[self.planner](self.grid)
+        # draw the path from wherever the boat is now
+        return self._planner.plot_path(self.grid.boat)
+
 
 if __name__ == '__main__':
     import doctest